@@ -0,0 +1,187 @@
+import numpy as np
+
+from model import FigureFactory
+
+class BatchSimulator(object):
+    """Many headless games advanced in lockstep. All the boards live in one NumPy array of row bitmasks,
+    so a placement, a collision check or a line clear is a single batched call for all the games.
+
+    Every board row is stored shifted by PAD bits with the wall bits set, and FLOOR fully occupied rows
+    are appended below the well, so the well borders are just occupied cells for the collision check.
+    The piece definitions are compiled from FigureFactory.FIGURES."""
+    NOOP, MOVE_LEFT, MOVE_RIGHT, ROTATE_CLOCKWISE, ROTATE_COUNTERCLOCKWISE, DROP = range(6)
+    PAD = 3         # enough for the widest empty leading area of a projection
+    FLOOR = 4       # the tallest projection
+
+    def __init__(self, games: int, rows: int = 25, cols: int = 12, seed: int = None) -> None:
+        super().__init__()
+        assert cols + 2 * BatchSimulator.PAD <= 32
+        self.__games = games
+        self.__rows = rows
+        self.__cols = cols
+        self.__rng = np.random.default_rng(seed)
+        self.__compile_figures()
+        wall = (1 << (cols + 2 * BatchSimulator.PAD)) - 1
+        self.__empty_row = np.uint32(wall ^ (((1 << cols) - 1) << BatchSimulator.PAD))
+        self.__full_row = np.uint32(wall)
+        self.__idx = np.arange(games)
+        self.reset()
+
+    def __compile_figures(self) -> None:
+        kinds = len(FigureFactory.FIGURES)
+        self.__rotation_count = np.array([len(projections) for projections in FigureFactory.FIGURES])
+        self.__figure_masks = np.zeros((kinds, 4, BatchSimulator.FLOOR), dtype=np.uint32)
+        self.__figure_cells = np.zeros((kinds, 4), dtype=np.int64)
+        self.__spawn_col = np.zeros((kinds, 4), dtype=np.int64)
+        self.__figure_bottoms = np.full((kinds, 4, 4), -1, dtype=np.int64)
+        for (kind, projections) in enumerate(FigureFactory.FIGURES):
+            for rotation in range(4):
+                # Projections are repeated cyclically, so a rotation index never has to be wrapped per piece kind.
+                projection = projections[rotation % len(projections)]
+                masks = projection.get_row_masks()
+                self.__figure_masks[kind, rotation, :len(masks)] = masks
+                self.__figure_cells[kind, rotation] = len(projection.get_cells_coords())
+                self.__spawn_col[kind, rotation] = projection.get_spawn_col(self.__cols)
+                profile = projection.get_bottom_profile()
+                self.__figure_bottoms[kind, rotation, :len(profile)] = profile
+
+    def __spawn(self, games: np.ndarray) -> None:
+        kinds = self.__rng.integers(0, len(self.__rotation_count), size=len(games))
+        rotations = self.__rng.integers(0, 4, size=len(games)) % self.__rotation_count[kinds]
+        self.__kind[games] = kinds
+        self.__rotation[games] = rotations
+        self.__row[games] = 0
+        self.__col[games] = self.__spawn_col[kinds, rotations]
+        self.__pieces[games] += 1
+        blocked = ~self.__fits(games, rotations, self.__row[games], self.__col[games])
+        self.__alive[games[blocked]] = False
+
+    def __shifted_masks(self, games: np.ndarray, rotations: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        masks = self.__figure_masks[self.__kind[games], rotations]
+        return masks << (cols + BatchSimulator.PAD).astype(np.uint32)[:, None]
+
+    def __board_rows(self, games: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return (games[:, None], rows[:, None] + np.arange(BatchSimulator.FLOOR))
+
+    def __fits(self, games: np.ndarray, rotations: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # Out of range columns are filtered out first - shifting by a negative count is not defined.
+        in_range = (cols >= -BatchSimulator.PAD) & (cols <= self.__cols)
+        safe_cols = np.where(in_range, cols, 0)
+        collisions = self.__boards[self.__board_rows(games, rows)] & self.__shifted_masks(games, rotations, safe_cols)
+        return in_range & ~collisions.any(axis=1)
+
+    def __try_move(self, games: np.ndarray, rotations: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        fits = self.__fits(games, rotations, rows, cols)
+        moved = games[fits]
+        self.__rotation[moved] = rotations[fits]
+        self.__row[moved] = rows[fits]
+        self.__col[moved] = cols[fits]
+        return fits
+
+    def __drop_distances(self, games: np.ndarray) -> np.ndarray:
+        """Rows the current figures of the games fall before they land - per figure column, the gap between
+        its lowest cell and the first occupied cell below, the floor rows stop every figure."""
+        bottoms = self.__row[games][:, None] + self.__figure_bottoms[self.__kind[games], self.__rotation[games]]
+        # The empty figure columns may lie past the padding, their bits are never looked at.
+        bits = np.minimum(self.__col[games][:, None] + BatchSimulator.PAD + np.arange(4), 31).astype(np.uint32)
+        occupied = (self.__boards[games][:, :, None] >> bits[:, None, :]) & 1 == 1
+        below = np.arange(self.__rows + BatchSimulator.FLOOR)[None, :, None] > bottoms[:, None, :]
+        landings = np.argmax(occupied & below, axis=1)
+        empty = self.__figure_bottoms[self.__kind[games], self.__rotation[games]] < 0
+        return np.where(empty, self.__rows, landings - bottoms - 1).min(axis=1)
+
+    def __lock(self, games: np.ndarray) -> None:
+        "Settles the current figures of the games, clears the completed lines and spawns the next figures."
+        shifted = self.__shifted_masks(games, self.__rotation[games], self.__col[games])
+        self.__boards[self.__board_rows(games, self.__row[games])] |= shifted
+        well = self.__boards[games, :self.__rows]
+        full = well == self.__full_row
+        cleared = full.sum(axis=1)
+        with_lines = cleared > 0
+        if with_lines.any():
+            # Stable sort moves the completed rows to the top keeping the order of the rest, then they get emptied.
+            order = np.argsort(~full[with_lines], axis=1, kind='stable')
+            compacted = np.take_along_axis(well[with_lines], order, axis=1)
+            compacted[np.arange(self.__rows) < cleared[with_lines][:, None]] = self.__empty_row
+            self.__boards[games[with_lines], :self.__rows] = compacted
+            self.__lines[games] += cleared
+            self.__score[games] += cleared * 100
+        self.__spawn(games)
+
+    def reset(self) -> None:
+        self.__boards = np.full((self.__games, self.__rows + BatchSimulator.FLOOR), self.__empty_row, dtype=np.uint32)
+        self.__boards[:, self.__rows:] = self.__full_row
+        self.__kind = np.zeros(self.__games, dtype=np.int64)
+        self.__rotation = np.zeros(self.__games, dtype=np.int64)
+        self.__row = np.zeros(self.__games, dtype=np.int64)
+        self.__col = np.zeros(self.__games, dtype=np.int64)
+        self.__alive = np.ones(self.__games, dtype=bool)
+        self.__score = np.zeros(self.__games, dtype=np.int64)
+        self.__lines = np.zeros(self.__games, dtype=np.int64)
+        self.__pieces = np.zeros(self.__games, dtype=np.int64)
+        self.__spawn(self.__idx)
+
+    def step(self, actions: np.ndarray) -> None:
+        "Applies one action code per game (NOOP, MOVE_LEFT, ...). Blocked moves are ignored, as in Controller."
+        games = self.__idx[self.__alive & (actions != BatchSimulator.NOOP)]
+        if not len(games):
+            return
+        actions = actions[games]
+        (rotations, rows, cols) = (self.__rotation[games].copy(), self.__row[games].copy(), self.__col[games].copy())
+        cols -= actions == BatchSimulator.MOVE_LEFT
+        cols += actions == BatchSimulator.MOVE_RIGHT
+        rotations += actions == BatchSimulator.ROTATE_CLOCKWISE
+        rotations -= actions == BatchSimulator.ROTATE_COUNTERCLOCKWISE
+        rotations %= self.__rotation_count[self.__kind[games]]
+        rows += actions == BatchSimulator.DROP
+        fits = self.__try_move(games, rotations, rows, cols)
+        dropping = actions == BatchSimulator.DROP
+        self.__score[games[dropping]] += 1
+        if (dropping & ~fits).any():
+            self.__lock(games[dropping & ~fits])
+
+    def tick(self) -> None:
+        "Gravity for all the running games."
+        games = self.__idx[self.__alive]
+        self.__score[games] += 1
+        landed = ~self.__try_move(games, self.__rotation[games], self.__row[games] + 1, self.__col[games])
+        if landed.any():
+            self.__lock(games[landed])
+
+    def place(self, rotations: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Puts the current figure of every running game into the given rotation and column at its current row
+        and hard-drops it. Returns the mask of the games where the placement was possible."""
+        games = self.__idx[self.__alive]
+        rotations = rotations[games] % self.__rotation_count[self.__kind[games]]
+        accepted = self.__try_move(games, rotations, self.__row[games], cols[games])
+        games = games[accepted]
+        self.__row[games] += self.__drop_distances(games)
+        self.__lock(games)
+        result = np.zeros(self.__games, dtype=bool)
+        result[games] = True
+        return result
+
+    def get_games(self) -> int:
+        return self.__games
+
+    def get_alive(self) -> np.ndarray:
+        return self.__alive
+
+    def get_score(self) -> np.ndarray:
+        return self.__score
+
+    def get_lines(self) -> np.ndarray:
+        return self.__lines
+
+    def get_pieces(self) -> np.ndarray:
+        "Number of figures spawned per game."
+        return self.__pieces
+
+    def get_figures(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        "Current figure per game as (kind, rotation, row, col) arrays."
+        return (self.__kind, self.__rotation, self.__row, self.__col)
+
+    def get_row_masks(self, game: int) -> list[int]:
+        "Board of a single game in the same format as Board.get_row_masks()."
+        well_mask = (1 << self.__cols) - 1
+        return [int(row) >> BatchSimulator.PAD & well_mask for row in self.__boards[game, :self.__rows]]
@@ -0,0 +1,197 @@
+import argparse, json, logging, random, sys, time
+from collections.abc import Callable
+
+from model import Board, Cell, FigureFactory, FigureRendering
+from view import BoardRenderer, CellRenderer
+from simulator import Simulator, play_random_game
+
+class NullCanvas(object):
+    "Canvas that only hands out item ids - the renderers are measured without Tk."
+    def __init__(self) -> None:
+        self.__next_item = 0
+
+    def create_polygon(self, coords, **options) -> int:
+        self.__next_item += 1
+        return self.__next_item
+
+    def coords(self, item, *coords) -> None:
+        pass
+
+    def itemconfigure(self, item, **options) -> None:
+        pass
+
+    def move(self, tag_or_id, dx, dy) -> None:
+        pass
+
+    def delete(self, tag_or_id) -> None:
+        pass
+
+def make_board(rows: int, cols: int, fill: float, full_rows: int = 0, seed: int = 0) -> Board:
+    """Board with the bottom fill share of the rows occupied, every one of them with a single random hole,
+    and full_rows completed rows spread among them."""
+    rnd = random.Random(seed)
+    filled = max(int(rows * fill), full_rows)
+    full = set(rnd.sample(range(rows - filled, rows), full_rows))
+    cells = []
+    for row in range(rows - filled, rows):
+        hole = -1 if row in full else rnd.randrange(cols)
+        cells.extend(Cell(row, col, rnd.randrange(4)) for col in range(cols) if col != hole)
+    return Board(rows, cols, cells)
+
+def bench_check_fit(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    board = make_board(rows, cols, fill)
+    figure = FigureFactory.get(5)
+    positions = [(row, col) for row in range(rows - 2) for col in range(cols - 2)]
+    def op() -> None:
+        for (row, col) in positions:
+            board.check_fit(figure, row, col)
+    return op
+
+def bench_get_layout(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    board = make_board(rows, cols, fill)
+    figure_cells = FigureRendering(board, FigureFactory.get(5), 0).to_cells()
+    return lambda: board.get_layout(figure_cells)
+
+def bench_get_completed_rows(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    board = make_board(rows, cols, fill, full_rows=2)
+    return board.get_completed_rows
+
+def bench_remove_rows(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    template = make_board(rows, cols, fill, full_rows=2)
+    completed = template.get_completed_rows()
+    boards = []
+    def op() -> None:
+        # The clones are made outside of the measured calls, remove_rows is destructive.
+        if not boards:
+            boards.extend(template.clone() for _ in range(100))
+        boards.pop().remove_rows(completed)
+    op.prepare = lambda number: boards.extend(template.clone() for _ in range(number))
+    return op
+
+def bench_figure_moves(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    board = make_board(rows, cols, min(fill, 0.5))
+    fr = FigureRendering(board, FigureFactory.get(5), 0)
+    def op() -> None:
+        fr.move_left()
+        fr.rotate_clockwise()
+        fr.move_right()
+        fr.rotate_counterclockwise()
+    return op
+
+def bench_render_board(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    "Board redraw after a placement - the renderer diffs the whole board against its registry."
+    board = make_board(rows, cols, fill)
+    renderer = BoardRenderer(board, NullCanvas(), 30)
+    renderer.display()
+    return renderer.display
+
+def bench_render_figure(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    board = make_board(rows, cols, 0)
+    frames = [FigureRendering(board, FigureFactory.get(5), 0, (row, 2)).to_cells() for row in range(2)]
+    renderer = CellRenderer(NullCanvas(), 30)
+    state = [0]
+    def op() -> None:
+        state[0] ^= 1
+        renderer.display(frames[state[0]])
+    return op
+
+def bench_headless_game(rows: int, cols: int, fill: float) -> Callable[[], None]:
+    sim = Simulator(rows, cols, seed=0)
+    rnd = random.Random(0)
+    def op() -> None:
+        play_random_game(sim, 10000, rnd)
+        sim.reset()
+    return op
+
+BENCHMARKS: dict[str, Callable[[int, int, float], Callable[[], None]]] = {
+    'check_fit': bench_check_fit,
+    'get_layout': bench_get_layout,
+    'get_completed_rows': bench_get_completed_rows,
+    'remove_rows': bench_remove_rows,
+    'figure_moves': bench_figure_moves,
+    'render_board': bench_render_board,
+    'render_figure': bench_render_figure,
+    'headless_game': bench_headless_game,
+}
+SIZES = ((25, 12), (50, 24))
+FILLS = (0.0, 0.5, 0.9)
+FILL_INDEPENDENT = ('render_figure', 'headless_game')
+
+def get_cases() -> list[tuple[str, str, int, int, float]]:
+    "(case name, benchmark name, rows, cols, fill) of every benchmark per board size and fill level."
+    cases = []
+    for name in BENCHMARKS:
+        for (rows, cols) in SIZES:
+            for fill in (FILLS[:1] if name in FILL_INDEPENDENT else FILLS):
+                cases.append((f'{name}[{rows}x{cols},fill={fill}]', name, rows, cols, fill))
+    return cases
+
+def measure(op: Callable[[], None], min_time_s: float = 0.2, repeat: int = 5) -> float:
+    "Best time of a call in microseconds. The number of calls per round is calibrated to take min_time_s."
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time_s / 10 or number >= 1 << 20:
+            break
+        number *= 2
+    number = max(1, int(number * min_time_s / max(elapsed, 1e-9)))
+    best = None
+    for _ in range(repeat):
+        if hasattr(op, 'prepare'):
+            op.prepare(number)
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+def run(filter: str = '', min_time_s: float = 0.2, repeat: int = 5) -> dict[str, float]:
+    "Runs the matching cases, returns microseconds per call by case name."
+    results = {}
+    for (case, name, rows, cols, fill) in get_cases():
+        if filter in case:
+            results[case] = measure(BENCHMARKS[name](rows, cols, fill), min_time_s, repeat)
+            logging.info(f'{case}: {results[case]:.2f} us')
+    return results
+
+def find_regressions(results: dict[str, float], baseline: dict[str, float],
+                     threshold: float) -> list[tuple[str, float, float]]:
+    "Cases slower than the baseline by more than the threshold share, as (case, baseline us, result us)."
+    return [(case, baseline[case], us) for (case, us) in results.items()
+            if case in baseline and us > baseline[case] * (1 + threshold)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the model and view hot paths.')
+    parser.add_argument('--filter', default='', help='run only the cases containing this string')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit with 1 if a case regressed against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown share, 0.25 is 25%%')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per measurement round')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.WARNING)
+    results = run(args.filter, args.min_time, args.repeat)
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    for (case, us) in results.items():
+        change = f'{(us / baseline[case] - 1) * 100:+6.1f}%' if case in baseline else '      -'
+        print(f'{case:<45} {us:12.2f} us {change}')
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.baseline}')
+    if args.check:
+        regressions = find_regressions(results, baseline, args.threshold)
+        for (case, before, after) in regressions:
+            print(f'REGRESSION {case}: {before:.2f} us -> {after:.2f} us')
+        sys.exit(1 if regressions else 0)
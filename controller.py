@@ -1,11 +1,23 @@
-import logging
+import logging, struct, time
 from collections.abc import Callable
+from typing import TYPE_CHECKING
 
-from model import Game, FigureFactory, FigureRendering, InvalidMoveException, GameOverException
-from view import CellStyles, BoardView
+from metrics import Metrics
+from tracing import TRACER, Tracer
+from model import Game, Figure, FigureFactory, FigureRendering, InvalidMoveException, GameOverException
+from styles import CellStyles
+
+if TYPE_CHECKING:
+    from view import BoardView     # not imported at run time - the headless game does not need Tk
 
 class Controller(object):
-    def __init__(self, game: Game, board_view: BoardView, game_over_callback: Callable[[], None] = None) -> None:
+    """Drives the game. The board view is optional - without it the controller runs headless (see simulator.py).
+    With auto_render off the moves only mark the view dirty and nothing is drawn until render() is called,
+    so any number of moves between two frames costs a single render pass (see gameloop.py).
+    The actions, new figures and renders are timed into the metrics while they are enabled."""
+    PIECE = struct.Struct('<?BBhhB')   # has a figure, kind, projection, row, col, style idx
+    def __init__(self, game: Game, board_view: 'BoardView' = None, game_over_callback: Callable[[], None] = None,
+                 auto_render: bool = True, metrics: Metrics = None) -> None:
         super().__init__()
         self.__push_down_interval_ms = 1000
         self.__game = game
@@ -13,82 +25,192 @@ class Controller(object):
         self.__board_view = board_view
         self.__game_over_callback = game_over_callback
         self.__new_figure_callback = None
+        self.__input_listener: Callable[[str], None] = None
+        self.__auto_render = auto_render
+        self.__board_dirty = False
+        self.__figure_dirty = False
+        self.__metrics = metrics if metrics else Metrics()
+
+    def __get_position(self) -> tuple[int, int]:
+        return (self.__figure_rendering.get_row(), self.__figure_rendering.get_col())
 
     def __refresh_display(self) -> None:
-        self.__board_view.get_figure_renderer().display(self.__figure_rendering.to_cells())
+        self.__figure_dirty = True
+        if self.__auto_render:
+            self.render()
 
     def __next_figure(self) -> None:
+        start = time.perf_counter() if self.__metrics.is_enabled() else None
         if self.__figure_rendering:
-            logging.debug(f'Put figure on the board as cells {self.__figure_rendering.to_cells()}')
-            self.__game.get_board().figure_final_placement(self.__figure_rendering.to_cells())
-            completed_rows = self.__game.get_board().get_completed_rows()
+            completed_rows = self.__game.get_board().figure_final_placement(self.__figure_rendering.to_cells())
             # TODO: It will be great to remove them one by one with some sort of animation.
             if completed_rows:
+                if start is not None:
+                    self.__metrics.count('lines', len(completed_rows))
                 self.__game.score_completed_rows(len(completed_rows))
                 self.__game.get_board().remove_rows(completed_rows)
-                self.__board_view.get_board_renderer().reset()
-                self.__board_view.get_board_renderer().clear_canvas()
-            self.__board_view.get_board_renderer().display()
-            self.__board_view.get_figure_renderer().reset()
-        figure = FigureFactory.get_random()
-        logging.info(f'New figure {figure.get_current_projection().get_layout()}')
+            # The canvas rows have to be shifted right away, the renderer registry follows the board row by row.
+            if self.__board_view and completed_rows:
+                self.__board_view.get_board_renderer().remove_rows(completed_rows)
+            self.__board_dirty = True
+        figure = self.__game.get_queue().next()
+        logging.debug('New figure %s', figure.get_current_projection().get_layout())
         try:
-            self.__figure_rendering = FigureRendering(self.__game.get_board(), figure, CellStyles.get_random_style_idx())
+            self.__figure_rendering = FigureRendering(self.__game.get_board(), figure, CellStyles.get_random_style_idx(self.__game.get_rng()))
+            if TRACER.enabled:
+                TRACER.record(Tracer.NEW_FIGURE, figure.get_kind(), figure.get_projection_idx(), self.__get_position()[1])
             self.__refresh_display()
             if self.__new_figure_callback:
                 self.__new_figure_callback(self.__figure_rendering)
         except GameOverException:
+            self.__figure_rendering = None  # the last figure is already on the board, nothing is falling any more
+            self.__refresh_display()
             if self.__game_over_callback:
                 self.__game_over_callback()
+        if start is not None:
+            self.__metrics.observe_since('next_figure', start)
 
-    def __move(self, mv_func, start_over_if_fails):
+    def __move(self, operation: str, mv_func, start_over_if_fails):
+        start = time.perf_counter() if self.__metrics.is_enabled() else None
         try:
             mv_func()
+            if TRACER.enabled:
+                TRACER.record(Tracer.MOVE, mv_func.__name__, *self.__get_position())
             self.__refresh_display()
-        except InvalidMoveException as e:
-            logging.debug(f'Blocking move: {e}')
+        except InvalidMoveException:
+            if TRACER.enabled:
+                TRACER.record(Tracer.BLOCKED, mv_func.__name__, *self.__get_position())
+            if start is not None:
+                self.__metrics.count(f'{operation}_blocked')
             if start_over_if_fails:
                 self.__next_figure()
+        if start is not None:
+            self.__metrics.observe_since(operation, start)
 
     def __go_down(self):
         self.__game.score_move_down()
-        self.__move(self.__figure_rendering.move_down, True)
+        self.__move('drop', self.__figure_rendering.move_down, True)
+
+    def get_game(self) -> Game:
+        return self.__game
+
+    def get_figure_rendering(self) -> FigureRendering:
+        "The falling figure, None before the start and after the game is over."
+        return self.__figure_rendering
+
+    def get_preview(self, n: int = 1) -> list[Figure]:
+        "Copies of the next n figures, in the order they will come."
+        return self.__game.get_queue().peek(n)
 
     def get_push_down_interval_ms(self) -> int:
         return self.__push_down_interval_ms
 
+    def set_input_listener(self, listener: Callable[[str], None]) -> None:
+        "The listener gets the name of every action method called, push_down included - see replay.InputLog."
+        self.__input_listener = listener
+
+    def get_metrics(self) -> Metrics:
+        return self.__metrics
+
+    def is_dirty(self) -> bool:
+        return self.__board_dirty or self.__figure_dirty
+
+    def render(self) -> bool:
+        "Draws the changes made since the previous render. Returns False if there was nothing to draw."
+        if not self.__board_view or not self.is_dirty():
+            return False
+        start = time.perf_counter() if self.__metrics.is_enabled() else None
+        if self.__board_dirty:
+            self.__board_view.get_board_renderer().display()
+        if self.__figure_dirty:
+            # The figure items are moved to the new figure cells, there is no need to recreate them for every figure.
+            self.__board_view.get_figure_renderer().display(self.__figure_rendering.to_cells()
+                                                            if self.__figure_rendering else [])
+        self.__board_dirty = False
+        self.__figure_dirty = False
+        if start is not None:
+            self.__metrics.observe_since('render', start)
+        return True
+
     def move_left(self) -> None:
-        logging.debug('Move left')
-        self.__move(self.__figure_rendering.move_left, False)
+        if self.__input_listener:
+            self.__input_listener('move_left')
+        self.__move('move', self.__figure_rendering.move_left, False)
 
     def move_right(self) -> None:
-        logging.debug('Move right')
-        self.__move(self.__figure_rendering.move_right, False)
+        if self.__input_listener:
+            self.__input_listener('move_right')
+        self.__move('move', self.__figure_rendering.move_right, False)
 
     def rotate_clockwise(self) -> None:
-        logging.debug('Rotate clockwise')
-        self.__move(self.__figure_rendering.rotate_clockwise, False)
+        if self.__input_listener:
+            self.__input_listener('rotate_clockwise')
+        self.__move('rotate', self.__figure_rendering.rotate_clockwise, False)
 
     def rotate_counterclockwise(self) -> None:
-        logging.debug('Rotate counterclockwise')
-        self.__move(self.__figure_rendering.rotate_counterclockwise, False)
+        if self.__input_listener:
+            self.__input_listener('rotate_counterclockwise')
+        self.__move('rotate', self.__figure_rendering.rotate_counterclockwise, False)
 
     def drop(self) -> None:
         "Down move initiated by user."
-        logging.debug('Drop')
+        if self.__input_listener:
+            self.__input_listener('drop')
         self.__go_down()
 
+    def hard_drop(self) -> None:
+        "Drops the figure straight to its landing row and puts it on the board."
+        if self.__input_listener:
+            self.__input_listener('hard_drop')
+        start = time.perf_counter() if self.__metrics.is_enabled() else None
+        self.__game.score_move_down(self.__figure_rendering.hard_drop() + 1)
+        if TRACER.enabled:
+            TRACER.record(Tracer.MOVE, 'hard_drop', *self.__get_position())
+        self.__refresh_display()
+        self.__next_figure()
+        if start is not None:
+            self.__metrics.observe_since('hard_drop', start)
+
     def push_down(self) -> None:
         "Down move initiated by system."
-        logging.debug('Push-down')
+        if self.__input_listener:
+            self.__input_listener('push_down')
         self.__go_down()
 
+    def snapshot(self, with_rng: bool = False) -> bytes:
+        "The current figure and Game.to_bytes() of the game."
+        fr = self.__figure_rendering
+        if fr:
+            piece = Controller.PIECE.pack(True, fr.get_figure().get_kind(), fr.get_figure().get_projection_idx(),
+                                          fr.get_row(), fr.get_col(), fr.get_style_idx())
+        else:
+            piece = Controller.PIECE.pack(False, 0, 0, 0, 0, 0)
+        return piece + self.__game.to_bytes(with_rng)
+
+    def restore(self, data: bytes, offset: int = 0) -> None:
+        """Puts the game and its current figure back to a snapshot() state at the offset of data.
+        The new figure callback is not called."""
+        (has_figure, kind, projection, row, col, style_idx) = Controller.PIECE.unpack_from(data, offset)
+        self.__game.restore(data, offset + Controller.PIECE.size)
+        self.__figure_rendering = None
+        if has_figure:
+            try:
+                self.__figure_rendering = FigureRendering(self.__game.get_board(), FigureFactory.get(kind, projection),
+                                                          style_idx, (row, col))
+            except GameOverException:
+                pass    # taken after the game was over - the last figure is already on the board
+        self.__board_dirty = True
+        self.__refresh_display()
+
     def start_game(self, new_figure_callback: Callable[[FigureRendering], None] = None) -> None:
         self.__new_figure_callback = new_figure_callback
         self.__next_figure()
 
-    def reset(self) -> None:
-        self.__game.reset()
-        self.__board_view.reset()
+    def reset(self, seed: int = None) -> None:
+        self.__game.reset(seed)
+        if self.__board_view:
+            self.__board_view.reset()
         self.__figure_rendering = None
-        self.start_game()
+        self.__board_dirty = False
+        self.__figure_dirty = False
+        self.start_game(self.__new_figure_callback)
@@ -1,23 +1,125 @@
-import google.generativeai as genai
-import json, logging, time
+import hashlib, importlib, json, logging, sqlite3, time
+from collections import OrderedDict
 from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from model import FigureRendering
+from model import FigureRendering, GameOverException, InvalidMoveException
+from jsonlog import JsonlWriter
 from controller import Controller
+from planner import BeamSearchPlanner, HeuristicPlanner
 
-class Copilot(object):
-    def __init__(self, ctr: Controller) -> None:
+class BoardEncoder(object):
+    "Text representation of the well for the prompts."
+    def describe(self) -> str:
+        "Explanation of the format for the model."
+        raise NotImplementedError()
+
+    def encode(self, layout: list[list[bool]], figure_cells: list[tuple[int, int]]) -> str:
+        "The layout includes the figure, its (row, col) cells are given separately."
+        raise NotImplementedError()
+
+class WordsEncoder(BoardEncoder):
+    "The original format - a word per cell, a line per row. The most verbose one."
+    def describe(self) -> str:
+        return 'Each row is a line, each cell is a word: "occupied" or "vacant".'
+
+    def encode(self, layout: list[list[bool]], figure_cells: list[tuple[int, int]]) -> str:
+        return '\n'.join([' '.join(['occupied' if cell else 'vacant' for cell in row]) for row in layout])
+
+class CharsEncoder(BoardEncoder):
+    "A character per cell."
+    def describe(self) -> str:
+        return 'Each row is a line, each cell is a character: "#" is occupied, "." is vacant.'
+
+    def encode(self, layout: list[list[bool]], figure_cells: list[tuple[int, int]]) -> str:
+        return '\n'.join([''.join(['#' if cell else '.' for cell in row]) for row in layout])
+
+class RowMasksEncoder(BoardEncoder):
+    "A number per row."
+    def describe(self) -> str:
+        return ('Each row is a line with a number, its binary digits are the cells: '
+                'bit 0 (the lowest) is the leftmost column, bit set means the cell is occupied.')
+
+    def encode(self, layout: list[list[bool]], figure_cells: list[tuple[int, int]]) -> str:
+        return '\n'.join([str(sum(1 << col for col in range(len(row)) if row[col])) for row in layout])
+
+class SkylineEncoder(BoardEncoder):
+    "Column heights and the holes below them - no rows at all."
+    def describe(self) -> str:
+        return ('The first line lists the column heights from the leftmost column, the height is the number of rows '
+                'from the bottom to the topmost occupied cell of the column. The second line lists the holes - vacant '
+                'cells below the top of their column - as "row:column" pairs, rows are counted from the top starting '
+                'with 0. The piece is described by the third line as "row:column" pairs of its cells.')
+
+    def encode(self, layout: list[list[bool]], figure_cells: list[tuple[int, int]]) -> str:
+        (rows, cols) = (len(layout), len(layout[0]))
+        piece = set(figure_cells)
+        heights = []
+        holes = []
+        for c in range(cols):
+            top = next((r for r in range(rows) if layout[r][c] and (r, c) not in piece), rows)
+            heights.append(rows - top)
+            holes.extend(f'{r}:{c}' for r in range(top + 1, rows) if not layout[r][c])
+        return '\n'.join([' '.join(map(str, heights)), ' '.join(holes) or 'none',
+                          ' '.join(f'{r}:{c}' for (r, c) in sorted(piece))])
+
+ENCODERS = {
+    'words': WordsEncoder,
+    'chars': CharsEncoder,
+    'masks': RowMasksEncoder,
+    'skyline': SkylineEncoder,
+}
+
+# The example situation of the system instruction: "#" is occupied, "." is vacant.
+EXAMPLE_WELL = ['....###.....', '......#.....'] + ['.' * 12] * 19 + ['#.##########'] * 2 + ['#####.######'] * 2
+EXAMPLE_FIGURE = [(0, 4), (0, 5), (0, 6), (1, 6)]
+
+class CopilotBackend(object):
+    "Source of the moves for a new figure - a list of \"move left\", \"rotate clockwise\", ..., \"release\"."
+    def needs_api_key(self) -> bool:
+        return False
+
+    def get_name(self) -> str:
+        "Identifies the backend and its settings - flights of different backends are not interchangeable."
+        return type(self).__name__
+
+    def get_preview_size(self) -> int:
+        "Number of the upcoming figure kinds plan() takes as its preview argument, 0 if it takes none."
+        return 0
+
+    def load(self) -> None:
+        "Prepares the backend for the first plan(), called when the co-pilot is turned on."
+        pass
+
+    def can_plan_ahead(self) -> bool:
+        """Cheap enough to plan the next figure on a predicted board, which is wasted if the prediction misses.
+        A remote backend pays a request for it and keeps the worker busy when the real flight is needed."""
+        return False
+
+    def plan(self, figure_rendering: FigureRendering, google_ai_api_key: str = None) -> list[str]:
+        raise NotImplementedError()
+
+class GeminiBackend(CopilotBackend):
+    """Asks Google AI for the moves. The SDK is imported and the model created on the first use (see load()) -
+    the import takes longer than the rest of the app start, and the game runs without the SDK installed."""
+    SDK = 'google.generativeai'
+    def __init__(self, encoding: str = 'chars', trace: JsonlWriter = None) -> None:
         super().__init__()
-        self.__flight_execution_interval_ms = 300
-        self.__ctr = ctr
-        self.__flight_ops = []
-        self.__current_fligh_op = 0
         self.__model_version = 'models/gemini-1.5-flash-latest'
-        self.__instruction = """You are an expert Tetris player. You will be helping another player to master the game of Tetris.
+        self.__encoding = encoding
+        self.__trace = trace
+        self.__encoder: BoardEncoder = ENCODERS[encoding]()
+        self.__requests = 0
+        self.__prompt_bytes = 0
+        self.__prompt_tokens = 0
+        self.__genai = None
+        self.__model = None
+        example = self.__encoder.encode([[cell == '#' for cell in row] for row in EXAMPLE_WELL], EXAMPLE_FIGURE)
+        self.__instruction = f"""You are an expert Tetris player. You will be helping another player to master the game of Tetris.
 
 You will be asked for an advice on how to deal with a piece in hands. The tetromino that you can move is at the top of the game field.
 
-The game board (also known as "well" or "matrix") has 25 rows and 12 columns. Each cell is marked as occupied or vacant.
+The game board (also known as "well" or "matrix") has 25 rows and 12 columns. {self.__encoder.describe()}
 
 Your response should be a sequence of actions - what to do with the piece to land it at the desired position, where the piece completes some lines or put (if line completion is not feasible) the piece strategically to make further line completion easier. 
 
@@ -25,42 +127,26 @@ The sequence of actions is the list of allowed actions: "move left", "move right
 
 For example:
 
-vacant vacant vacant vacant occupied occupied occupied vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant occupied vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant vacant 
-occupied vacant occupied occupied occupied occupied occupied occupied occupied occupied occupied occupied 
-occupied vacant occupied occupied occupied occupied occupied occupied occupied occupied occupied occupied 
-occupied occupied occupied occupied occupied vacant occupied occupied occupied occupied occupied occupied 
-occupied occupied occupied occupied occupied vacant occupied occupied occupied occupied occupied occupied 
+{example}
 
 The sequence of actions to land the piece will be "rotate counterclockwise", "move left", "move left", "move left", "release".
 
 The "release" must be the last command since after that the piece just drops down.
 """
-        self.__model = genai.GenerativeModel(self.__model_version,
-                                             system_instruction=self.__instruction,
-                                             generation_config={"temperature": 0})
+
+    def load(self) -> None:
+        "Imports the SDK and creates the model unless done already. Raises ImportError if the SDK is not installed."
+        if self.__model:
+            return
+        start = time.perf_counter()
+        self.__genai = importlib.import_module(GeminiBackend.SDK)
+        self.__model = self.__genai.GenerativeModel(self.__model_version,
+                                                    system_instruction=self.__instruction,
+                                                    generation_config={"temperature": 0})
+        logging.info(f'Google AI SDK loaded in {(time.perf_counter() - start) * 1000:.0f}ms')
 
     def __ask_ai(self, well_text: str) -> None:
-        prompt = f"""Advise how to land the tetromino currently located at the top (at the middle of the first row) on the board of 12 cols and 25 rows, where "vacant" represents a free cell and "occupied" means that the cell is occupied.
+        prompt = f"""Advise how to land the tetromino currently located at the top (at the middle of the first row) on the board of 12 cols and 25 rows. {self.__encoder.describe()}
 
 {well_text}
 
@@ -68,32 +154,324 @@ Generate list of entities in text based on the following Python class structure:
 list[str]
 """
         
+        start = time.perf_counter()
         response = self.__model.generate_content(prompt,
                                                  generation_config={"response_mime_type": "application/json"})
-        logging.debug(f'AI response:{response}')
+        latency_ms = (time.perf_counter() - start) * 1000
+        prompt_bytes = len(prompt.encode())
+        prompt_tokens = response.usage_metadata.prompt_token_count
+        self.__requests += 1
+        self.__prompt_bytes += prompt_bytes
+        self.__prompt_tokens += prompt_tokens
+        logging.info(f'AI request with {self.__encoding} encoding: {prompt_bytes} bytes, {prompt_tokens} prompt tokens '
+                     f'(system instruction included)')
         logging.info(f'AI response text:{response.text}')
-        with open(time.strftime('%Y%m%d-%H%M%S') + '.log', 'w') as f:
-            f.write(prompt + '\n' + '*' * 100)
-            f.write(str(response) + '\n' + '*' * 100 + '\n')
-            f.write(response.text)
+        if self.__trace:
+            self.__trace.write({
+                'ts': time.time(),
+                'model': self.__model_version,
+                'encoding': self.__encoding,
+                'latency_ms': round(latency_ms, 1),
+                'prompt_bytes': prompt_bytes,
+                'prompt_tokens': prompt_tokens,
+                'response_bytes': len(response.text.encode()),
+                'response_tokens': response.usage_metadata.candidates_token_count,
+                'prompt': prompt,
+                'response': response.text,
+            })
         return response.text
 
-    def __parse_ai_response(self, text: str) -> list[Callable[[], None]]:
-        result: list[Callable[[], None]] = []
+    def needs_api_key(self) -> bool:
+        return True
+
+    def get_name(self) -> str:
+        return f'{super().get_name()}/{self.__encoding}'
+
+    def get_stats(self) -> dict[str, float | str]:
+        "Request payload measurements for the encodings comparison."
+        return {
+            'encoding': self.__encoding,
+            'requests': self.__requests,
+            'avg_prompt_bytes': self.__prompt_bytes / self.__requests if self.__requests else 0,
+            'avg_prompt_tokens': self.__prompt_tokens / self.__requests if self.__requests else 0,
+        }
+
+    def plan(self, figure_rendering: FigureRendering, google_ai_api_key: str = None) -> list[str]:
+        logging.info(f'Calling Google AI with API key {google_ai_api_key[:5]}...')
+        assert google_ai_api_key is not None
+        well = figure_rendering.get_layout()
+        figure_cells = [(cell.get_row(), cell.get_col()) for cell in figure_rendering.to_cells()]
+        well_text = self.__encoder.encode(well, figure_cells)
+        self.load()
+        self.__genai.configure(api_key=google_ai_api_key)
+        return json.loads(self.__ask_ai(well_text))
+
+class LocalBackend(CopilotBackend):
+    "Built-in heuristic planner, no network round-trip."
+    def __init__(self, planner: HeuristicPlanner = None) -> None:
+        super().__init__()
+        self.__planner = planner if planner else HeuristicPlanner()
+
+    def can_plan_ahead(self) -> bool:
+        return True
+
+    def get_name(self) -> str:
+        if self.__planner.get_weights() == HeuristicPlanner.DEFAULT_WEIGHTS:
+            return super().get_name()
+        digest = hashlib.blake2b(json.dumps(self.__planner.get_weights(), sort_keys=True).encode(), digest_size=4)
+        return f'{super().get_name()}/{digest.hexdigest()}'
+
+    def plan(self, figure_rendering: FigureRendering, google_ai_api_key: str = None) -> list[str]:
+        return self.__planner.plan(figure_rendering)
+
+class BeamBackend(LocalBackend):
+    "Built-in lookahead planner (BeamSearchPlanner) answering within its time budget."
+    def __init__(self, planner: BeamSearchPlanner = None) -> None:
+        self.__planner = planner if planner else BeamSearchPlanner()
+        super().__init__(self.__planner)
+
+    def get_preview_size(self) -> int:
+        return self.__planner.get_depth() - 1
+
+    def plan(self, figure_rendering: FigureRendering, google_ai_api_key: str = None,
+             preview: list[int] = ()) -> list[str]:
+        return self.__planner.plan(figure_rendering, preview)
+
+class PlanCache(object):
+    """LRU cache of the flights (lists of moves) keyed by the board and the figure. The backends answer the same
+    for the same situation, so a repeated one costs a dictionary lookup instead of a call. With a path given,
+    the cache is persisted in a sqlite file and shared across sessions. The use times of the hits are written
+    with the next put() or at close(), so the persisted cache is loaded back in the LRU order."""
+    def __init__(self, max_size: int = 10000, path: str = None) -> None:
+        super().__init__()
+        self.__max_size = max_size
+        self.__plans: OrderedDict[str, list[str]] = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__used: dict[str, float] = {}     # use times of the hits not written to the database yet
+        self.__db = None
+        if path:
+            self.__db = sqlite3.connect(path)
+            self.__db.execute('PRAGMA journal_mode=WAL')
+            # No fsync per commit, put() runs on the UI thread. Under WAL a crash loses the last plans at worst.
+            self.__db.execute('PRAGMA synchronous=NORMAL')
+            self.__db.execute('CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, moves TEXT, used REAL)')
+            rows = self.__db.execute('SELECT key, moves FROM plans ORDER BY used DESC LIMIT ?', (max_size,)).fetchall()
+            for (key, moves) in reversed(rows):
+                self.__plans[key] = json.loads(moves)
+            logging.info(f'Plan cache loaded {len(self.__plans)} plans from {path}')
+
+    @staticmethod
+    def make_key(figure_rendering: FigureRendering, backend: str, preview: list[int] = ()) -> str:
+        "Canonical hash of the settled cells, the figure kind and rotation, its position and the preview kinds."
+        board = figure_rendering.get_board()
+        figure = figure_rendering.get_figure()
+        row_bytes = (board.get_cols() + 7) // 8
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{backend}:{board.get_rows()}x{board.get_cols()}:{figure.get_kind()}:{figure.get_projection_idx()}:'
+                      f'{figure_rendering.get_row()}:{figure_rendering.get_col()}:'.encode())
+        for mask in board.get_row_masks():
+            digest.update(mask.to_bytes(row_bytes, 'little'))
+        if figure.get_kind() < 0:
+            digest.update(repr(figure.get_current_projection().get_row_masks()).encode())
+        if preview:
+            digest.update(bytes(preview))
+        return digest.hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        "Membership test, neither counted as a hit or a miss nor refreshing the entry."
+        return key in self.__plans
+
+    def get(self, key: str) -> list[str]:
+        moves = self.__plans.get(key)
+        if moves is None:
+            self.__misses += 1
+            return None
+        self.__hits += 1
+        self.__plans.move_to_end(key)
+        if self.__db:
+            self.__used[key] = time.time()
+        return moves
+
+    def __write_used(self) -> None:
+        self.__db.executemany('UPDATE plans SET used = ? WHERE key = ?', [(t, k) for (k, t) in self.__used.items()])
+        self.__used.clear()
+
+    def put(self, key: str, moves: list[str]) -> None:
+        self.__plans[key] = moves
+        self.__plans.move_to_end(key)
+        evicted = []
+        while len(self.__plans) > self.__max_size:
+            evicted.append(self.__plans.popitem(last=False)[0])
+        if self.__db:
+            self.__db.execute('INSERT OR REPLACE INTO plans VALUES (?, ?, ?)', (key, json.dumps(moves), time.time()))
+            self.__db.executemany('DELETE FROM plans WHERE key = ?', [(k,) for k in evicted])
+            self.__write_used()
+            self.__db.commit()
+
+    def get_size(self) -> int:
+        return len(self.__plans)
+
+    def get_hits(self) -> int:
+        return self.__hits
+
+    def get_misses(self) -> int:
+        return self.__misses
+
+    def close(self) -> None:
+        if self.__db:
+            self.__write_used()
+            self.__db.commit()
+            self.__db.close()
+            self.__db = None
+
+class Copilot(object):
+    """Builds and executes flights - the moves landing the current figure.
+    If a Tk-style after() scheduler is given, flights are planned on a worker thread and the results are polled
+    from the scheduler, so the UI keeps running while the backend thinks. Otherwise the planning is synchronous.
+    With a scheduler, a plan cache and a local backend, the flight of the next figure (known from the queue) is
+    planned while the current one is still falling, on the board the current flight will leave - if it lands as
+    planned, the next flight is a cache hit at spawn time."""
+    BACKENDS = {
+        'gemini': GeminiBackend,
+        'local': LocalBackend,
+        'beam': BeamBackend,
+    }
+
+    def __init__(self, ctr: Controller, backend: str | CopilotBackend = 'gemini',
+                 after: Callable[[int, Callable[[], None]], None] = None, timeout_s: float = 10,
+                 plan_cache: PlanCache = None) -> None:
+        super().__init__()
+        self.__flight_execution_interval_ms = 300
+        self.__poll_interval_ms = 20
+        self.__ctr = ctr
+        self.__flight_ops: list[str] = []
+        self.__backend: CopilotBackend = Copilot.BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.__after = after
+        self.__timeout_s = timeout_s
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='copilot') if after else None
+        self.__pending: tuple[Future, FigureRendering, float, str] = None
+        self.__speculative: tuple[Future, str] = None
+        self.__plan_cache = plan_cache
+        self.__google_ai_api_key: str = None
+
+    def __install_flight(self, moves: list[str]) -> None:
+        self.__flight_ops = self.__parse_moves(moves)
+        logging.info(f'The flight build is completed. There are {len(self.__flight_ops)} moves.')
+        self.__speculate()
+
+    def __get_preview(self, skip: int) -> list[int]:
+        "Kinds of the upcoming figures the backend looks at, the first skip ones of the queue are left out."
+        size = self.__backend.get_preview_size()
+        return [figure.get_kind() for figure in self.__ctr.get_preview(skip + size)[skip:]] if size else []
+
+    def __predict_next(self, actions: list[str]) -> FigureRendering:
+        """The next figure at its spawn position on a copy of the board as the flight actions will leave it,
+        None if the next figure will not fit."""
+        try:
+            probe = self.__ctr.get_figure_rendering().clone()
+            for action in actions:
+                if action == 'hard_drop':
+                    break
+                try:
+                    getattr(probe, action)()
+                except InvalidMoveException:
+                    pass    # skipped by the flight compilation as well
+            probe.hard_drop()
+            board = probe.get_board()
+            completed_rows = board.figure_final_placement(probe.to_cells())
+            if completed_rows:
+                board.remove_rows(completed_rows)
+            return FigureRendering(board, self.__ctr.get_preview(1)[0], 0)  # the style is not a part of the key
+        except GameOverException:
+            return None
+
+    def __speculate(self) -> None:
+        "Starts planning the next figure on the predicted board unless the plan is cached or another one is running."
+        if (not self.__executor or not self.__plan_cache or self.__speculative or not self.__ctr.get_figure_rendering()
+                or not self.__backend.can_plan_ahead()):
+            return
+        figure_rendering = self.__predict_next(self.__flight_ops)
+        if not figure_rendering:
+            return
+        preview = self.__get_preview(1)
+        key = PlanCache.make_key(figure_rendering, self.__backend.get_name(), preview)
+        if key in self.__plan_cache:
+            return
+        logging.info('Planning the next figure in advance.')
+        future = self.__executor.submit(self.__plan, figure_rendering, self.__google_ai_api_key, preview)
+        self.__speculative = (future, key)
+        self.__after(self.__poll_interval_ms, self.__poll_speculative)
+
+    def __poll_speculative(self) -> None:
+        if not self.__speculative:
+            return      # taken over by build_flight() or cancelled
+        (future, key) = self.__speculative
+        if not future.done():
+            self.__after(self.__poll_interval_ms, self.__poll_speculative)
+            return
+        self.__speculative = None
+        if future.cancelled():
+            return
+        if future.exception():
+            logging.warning(f'The flight build in advance failed: {future.exception()}')
+        else:
+            self.__plan_cache.put(key, future.result())
+
+    def __poll(self) -> None:
+        if not self.__pending:
+            return
+        (future, figure_rendering, deadline, key) = self.__pending
+        if deadline is None and future.running():
+            # Counted from the start of the call, the wait behind the build in advance is not a part of it.
+            deadline = time.monotonic() + self.__timeout_s
+            self.__pending = (future, figure_rendering, deadline, key)
+        if future.done():
+            self.__pending = None
+            if future.cancelled():
+                return
+            if self.__plan_cache and not future.exception():
+                self.__plan_cache.put(key, future.result())
+            if figure_rendering is not self.__ctr.get_figure_rendering():
+                logging.info('The figure has landed before the flight was built, the flight is discarded.')
+            elif future.exception():
+                logging.error(f'The flight build failed: {future.exception()}')
+            else:
+                self.__install_flight(future.result())
+        elif deadline is not None and time.monotonic() > deadline:
+            logging.warning(f'The flight build is over the {self.__timeout_s}s timeout, the flight is discarded.')
+            self.__cancel_flight()
+        else:
+            self.__after(self.__poll_interval_ms, self.__poll)
+
+    def __plan(self, figure_rendering: FigureRendering, google_ai_api_key: str, preview: list[int]) -> list[str]:
+        "The backend call, timed as the copilot operation of the controller metrics."
+        metrics = self.__ctr.get_metrics()
+        start = time.perf_counter() if metrics.is_enabled() else None
+        if self.__backend.get_preview_size():
+            moves = self.__backend.plan(figure_rendering, google_ai_api_key, preview)
+        else:
+            moves = self.__backend.plan(figure_rendering, google_ai_api_key)
+        if start is not None:
+            metrics.observe_since('copilot', start)
+        return moves
+
+    def __parse_moves(self, moves: list[str]) -> list[str]:
+        "Maps the moves to the Controller action names."
+        result: list[str] = []
         errors: list[str] = []
-        moves = json.loads(text)
         for move in moves:
             logging.info(f'Processing move {move}')
             if 'left' in move:
-                result.append(self.__ctr.move_left)
+                result.append('move_left')
             elif 'right' in move:
-                result.append(self.__ctr.move_right)
-            elif 'clockwise' in move:
-                result.append(self.__ctr.rotate_clockwise)
+                result.append('move_right')
             elif 'counter' in move:
-                result.append(self.__ctr.rotate_counterclockwise)
+                result.append('rotate_counterclockwise')
+            elif 'clockwise' in move:
+                result.append('rotate_clockwise')
             elif 'release' in move:
-                result.append(self.__ctr.drop)
+                result.append('hard_drop')
             else:
                 errors.append(move)
         if errors:
@@ -102,34 +480,125 @@ list[str]
             logging.info(f'AI response parsing done successfully, there are {len(result)} moves scheduled in flight.')
         return result
 
+    @staticmethod
+    def __try_actions(figure_rendering: FigureRendering, actions: list[str]) -> bool:
+        "Checks the actions on a copy of the figure."
+        probe = figure_rendering.clone()
+        try:
+            for action in actions:
+                getattr(probe, action)()
+        except InvalidMoveException:
+            return False
+        return True
+
+    def __compile_flight(self, actions: list[str]) -> list[str]:
+        """Replays the actions on a copy of the current figure and its board skipping the illegal ones, then collapses
+        them into the shortest way to the same (rotation, column) target. Returns no actions if nothing is legal."""
+        figure_rendering = self.__ctr.get_figure_rendering()
+        probe = figure_rendering.clone()
+        applied = []
+        released = False
+        for action in actions:
+            if action == 'hard_drop':
+                released = True
+                break
+            try:
+                getattr(probe, action)()
+                applied.append(action)
+            except InvalidMoveException:
+                logging.warning(f'Illegal {action} is skipped, the flight is repaired.')
+        moves_count = len(actions) - (1 if released else 0)
+        if moves_count and not applied:
+            logging.warning('None of the flight moves is legal, the flight is rejected.')
+            return []
+        count = probe.get_figure().get_projection_count()
+        steps = (probe.get_figure().get_projection_idx() - figure_rendering.get_figure().get_projection_idx()) % count
+        if steps > count // 2:
+            steps -= count
+        rotations = ['rotate_clockwise' if steps > 0 else 'rotate_counterclockwise'] * abs(steps)
+        shift = probe.get_col() - figure_rendering.get_col()
+        shifts = ['move_right' if shift > 0 else 'move_left'] * abs(shift)
+        # The applied actions are legal by construction - the fallback if neither short way is clear.
+        compiled = next((way for way in (rotations + shifts, shifts + rotations)
+                         if Copilot.__try_actions(figure_rendering, way)), applied)
+        return compiled + (['hard_drop'] if released else [])
+
+    def needs_api_key(self) -> bool:
+        return self.__backend.needs_api_key()
+
+    def load(self) -> None:
+        "Loads the backend (the AI SDK of the Gemini one), deferred till the co-pilot is turned on."
+        self.__backend.load()
+
     def get_flight_execution_interval_ms(self) -> int:
         return self.__flight_execution_interval_ms
 
-    def build_flight(self, figure_rendering: FigureRendering, google_ai_api_key: str) -> None:
-        logging.info(f'Build flight, calling Google AI with API key {google_ai_api_key[:5]}...')
-        assert google_ai_api_key is not None
-        well = figure_rendering.get_layout()
-        well_text = '\n'.join([''.join(['occupied' if cell else 'vacant' for cell in row]) for row in well])
-        genai.configure(api_key=google_ai_api_key)
-        response_text = self.__ask_ai(well_text)
-        self.__flight_ops = self.__parse_ai_response(response_text)
-        self.__current_fligh_op = 0
-        logging.info(f'The flight build is completed. There are {len(self.__flight_ops)} moves.')
+    def build_flight(self, figure_rendering: FigureRendering, google_ai_api_key: str = None) -> None:
+        logging.info(f'Build flight with {self.__backend.get_name()}...')
+        self.__cancel_flight()
+        self.__google_ai_api_key = google_ai_api_key
+        preview = self.__get_preview(0)
+        key = None
+        if self.__plan_cache:
+            key = PlanCache.make_key(figure_rendering, self.__backend.get_name(), preview)
+            moves = self.__plan_cache.get(key)
+            if moves is not None:
+                logging.info('The flight is found in the plan cache.')
+                if self.__ctr.get_metrics().is_enabled():
+                    self.__ctr.get_metrics().count('copilot_cache_hit')
+                self.__install_flight(moves)
+                return
+        if not self.__executor:
+            moves = self.__plan(figure_rendering, google_ai_api_key, preview)
+            if self.__plan_cache:
+                self.__plan_cache.put(key, moves)
+            self.__install_flight(moves)
+            return
+        if self.__speculative and self.__speculative[1] == key:
+            # Predicted right but not planned yet - the build in advance becomes the flight build.
+            (future, self.__speculative) = (self.__speculative[0], None)
+        else:
+            # The worker gets its own copy - the board keeps changing on the UI thread.
+            future = self.__executor.submit(self.__plan, figure_rendering.clone(), google_ai_api_key, preview)
+        self.__pending = (future, figure_rendering, None, key)     # the deadline is set once the call starts
+        self.__after(self.__poll_interval_ms, self.__poll)
+
+    def is_building(self) -> bool:
+        return self.__pending is not None
+
+    def is_building_ahead(self) -> bool:
+        "The flight of the next figure is being planned in advance."
+        return self.__speculative is not None
+
+    def __cancel_flight(self) -> None:
+        self.__flight_ops = []
+        if self.__pending:
+            self.__pending[0].cancel()
+            self.__pending = None
+
+    def cancel(self) -> None:
+        """Drops the current flight, the one being built and the one built in advance (the backend call itself
+        can not be interrupted)."""
+        self.__cancel_flight()
+        if self.__speculative:
+            self.__speculative[0].cancel()
+            self.__speculative = None
+
+    def shutdown(self) -> None:
+        self.cancel()
+        if self.__executor:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+        if self.__plan_cache:
+            logging.info(f'Plan cache: {self.__plan_cache.get_hits()} hits, {self.__plan_cache.get_misses()} misses, '
+                         f'{self.__plan_cache.get_size()} plans')
+            self.__plan_cache.close()
 
     def execute_flight(self) -> None:
-        logging.info('Execute flight move')
-        if self.__flight_ops:
-            logging.info(f'Executing move {self.__current_fligh_op+1} of {len(self.__flight_ops)}')
-            move_func = self.__flight_ops[self.__current_fligh_op]
-            move_func()
-            if self.__current_fligh_op < len(self.__flight_ops) - 1:
-                self.__current_fligh_op += 1
-            elif self.__current_fligh_op == len(self.__flight_ops) - 1:
-                if move_func == self.__ctr.drop:
-                    pass    # this is "release" - let it go down quickly
-                else:
-                    logging.warn(f'The last move in the sequence is not "release"')
-                    self.__current_fligh_op = len(self.__flight_ops)
-            else:
-                # the flight is over
-                pass
+        "Validates the flight against the current state and applies all of it at once."
+        if not self.__ctr.get_figure_rendering():
+            self.__flight_ops = []  # the game is over, there is nothing to fly
+        elif self.__flight_ops:
+            (actions, self.__flight_ops) = (self.__compile_flight(self.__flight_ops), [])
+            logging.info(f'Executing flight {actions}')
+            for action in actions:
+                getattr(self.__ctr, action)()
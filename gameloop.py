@@ -0,0 +1,100 @@
+import logging, time
+from collections import deque
+from collections.abc import Callable
+
+class GameLoop(object):
+    """Single fixed-timestep scheduler of the app. Every frame drains the queued input, runs the timers that
+    are due (gravity, co-pilot) and renders once, however many moves were made in the frame.
+    The loop is driven by an after(ms, func) function (Tk root.after) and does not reschedule itself while
+    is_active() is False (pause, game over) - wake() starts it again."""
+    MAX_CATCH_UP = 5    # timer steps run in one frame at most, the rest is dropped after a long stall
+
+    class Timer(object):
+        def __init__(self, get_interval_ms: Callable[[], int], func: Callable[[], None]) -> None:
+            super().__init__()
+            self.get_interval_ms = get_interval_ms
+            self.func = func
+            self.due = 0.0
+
+    def __init__(self, after: Callable[[int, Callable[[], None]], object], render: Callable[[], bool],
+                 is_active: Callable[[], bool] = lambda: True, frame_ms: int = 16,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        super().__init__()
+        self.__after = after
+        self.__render = render
+        self.__is_active = is_active
+        self.__frame_ms = frame_ms
+        self.__clock = clock
+        self.__inputs: deque[Callable[[], None]] = deque()
+        self.__timers: list[GameLoop.Timer] = []
+        self.__running = False
+        self.__frames = 0
+        self.__renders = 0
+        self.__frame_time_total_s = 0.0
+        self.__frame_time_max_s = 0.0
+        self.__frame_time_last_s = 0.0
+
+    def __restart_timers(self, now: float) -> None:
+        # Time spent idle does not count - no burst of gravity steps after a pause.
+        for timer in self.__timers:
+            timer.due = now + timer.get_interval_ms() / 1000
+
+    def __run_timers(self, now: float) -> None:
+        for timer in self.__timers:
+            steps = 0
+            while now >= timer.due and steps < GameLoop.MAX_CATCH_UP and self.__is_active():
+                timer.func()
+                timer.due += timer.get_interval_ms() / 1000
+                steps += 1
+            if now >= timer.due:
+                timer.due = now + timer.get_interval_ms() / 1000
+
+    def __frame(self) -> None:
+        if not self.__is_active():
+            self.__running = False
+            self.__inputs.clear()
+            logging.debug('Game loop is idle')
+            return
+        start = self.__clock()
+        while self.__inputs and self.__is_active():
+            self.__inputs.popleft()()
+        self.__run_timers(start)
+        if self.__render():
+            self.__renders += 1
+        elapsed = self.__clock() - start
+        self.__frames += 1
+        self.__frame_time_last_s = elapsed
+        self.__frame_time_total_s += elapsed
+        self.__frame_time_max_s = max(self.__frame_time_max_s, elapsed)
+        self.__after(max(1, self.__frame_ms - int(elapsed * 1000)), self.__frame)
+
+    def add_timer(self, get_interval_ms: Callable[[], int], func: Callable[[], None]) -> None:
+        "Runs func every get_interval_ms() milliseconds of active game time."
+        timer = GameLoop.Timer(get_interval_ms, func)
+        timer.due = self.__clock() + get_interval_ms() / 1000
+        self.__timers.append(timer)
+
+    def push_input(self, action: Callable[[], None]) -> None:
+        "Queues a player action till the next frame. Ignored while the loop is idle."
+        if self.__running:
+            self.__inputs.append(action)
+
+    def is_running(self) -> bool:
+        return self.__running
+
+    def wake(self) -> None:
+        "Starts the loop (again) if it is idle."
+        if not self.__running:
+            self.__running = True
+            self.__restart_timers(self.__clock())
+            self.__after(self.__frame_ms, self.__frame)
+
+    def get_frame_stats(self) -> dict[str, float]:
+        "Frame count, render count and the frame times (the work done in a frame) in milliseconds."
+        return {
+            'frames': self.__frames,
+            'renders': self.__renders,
+            'last_ms': self.__frame_time_last_s * 1000,
+            'avg_ms': self.__frame_time_total_s * 1000 / self.__frames if self.__frames else 0.0,
+            'max_ms': self.__frame_time_max_s * 1000,
+        }
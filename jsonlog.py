@@ -0,0 +1,68 @@
+import json, logging, os, queue, threading, time
+
+class JsonlWriter(object):
+    """Append-only JSON lines file. write() just puts the record on a queue - serialization, batched writes,
+    flushes and size-based rotation happen on a background thread, so the caller never waits for the disk."""
+    def __init__(self, path: str, max_bytes: int = 10 * 1024 * 1024, backups: int = 3,
+                 flush_interval_s: float = 1, batch_size: int = 100) -> None:
+        super().__init__()
+        self.__path = path
+        self.__max_bytes = max_bytes
+        self.__backups = backups
+        self.__flush_interval_s = flush_interval_s
+        self.__batch_size = batch_size
+        self.__queue: queue.SimpleQueue[dict] = queue.SimpleQueue()
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run, name='jsonlog', daemon=True)
+        self.__thread.start()
+
+    def __rotate(self) -> None:
+        for i in range(self.__backups - 1, 0, -1):
+            if os.path.exists(f'{self.__path}.{i}'):
+                os.replace(f'{self.__path}.{i}', f'{self.__path}.{i + 1}')
+        if self.__backups > 0:
+            os.replace(self.__path, f'{self.__path}.1')
+        else:
+            os.remove(self.__path)
+
+    def __write_batch(self, batch: list[dict]) -> None:
+        if os.path.exists(self.__path) and os.path.getsize(self.__path) >= self.__max_bytes:
+            self.__rotate()
+        with open(self.__path, 'a') as f:
+            f.write(''.join(json.dumps(record, default=str) + '\n' for record in batch))
+
+    def __run(self) -> None:
+        batch = []
+        flush_at = time.monotonic() + self.__flush_interval_s
+        while True:
+            try:
+                record = self.__queue.get(timeout=max(0, flush_at - time.monotonic()))
+            except queue.Empty:
+                record = None
+            stop = record is self
+            if record is not None and not stop:
+                batch.append(record)
+            if batch and (stop or len(batch) >= self.__batch_size or time.monotonic() >= flush_at):
+                try:
+                    self.__write_batch(batch)
+                except OSError as e:
+                    logging.error(f'Can not write {len(batch)} records to {self.__path}: {e}')
+                batch = []
+            if time.monotonic() >= flush_at:
+                flush_at = time.monotonic() + self.__flush_interval_s
+            if stop:
+                return
+
+    def get_path(self) -> str:
+        return self.__path
+
+    def write(self, record: dict) -> None:
+        if not self.__closed:
+            self.__queue.put(record)
+
+    def close(self) -> None:
+        "Writes the queued records and stops the writer thread."
+        if not self.__closed:
+            self.__closed = True
+            self.__queue.put(self)    # the stop marker
+            self.__thread.join()
@@ -1,15 +1,25 @@
-import os, sys, logging
+import os, sys, logging, time
+STARTED = time.perf_counter()   # the startup report counts from here, the interpreter start is not included
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 
 from model import Game, FigureRendering
 from view import BoardView
 from controller import Controller
-from copilot import Copilot
+from copilot import Copilot, BeamBackend, GeminiBackend, LocalBackend, PlanCache
+from planner import BeamSearchPlanner, HeuristicPlanner
+from jsonlog import JsonlWriter
+from gameloop import GameLoop
+from metrics import Metrics
+from tracing import TRACER
+from replay import InputLog
+IMPORTED = time.perf_counter()
 
 class App(object):
-    def __init__(self, root: tk.Tk) -> None:
+    def __init__(self, root: tk.Tk, startup_ms: dict[str, float] = None) -> None:
         super().__init__()
+        self.__init_started = time.perf_counter()
+        self.__startup_ms = dict(startup_ms or {})   # reported and dropped at the first frame
         self.__board_rows = 25
         self.__board_cols = 12
         self.__cell_size_px = 30
@@ -19,9 +29,36 @@ class App(object):
         self.__copilot_is_active = False
         self.__google_ai_api_key = None
         self.__google_ai_api_key_env_var = 'GOOGLE_AI_APIKEY'
+        self.__copilot_backend_env_var = 'TETRIS_COPILOT_BACKEND'
+        self.__copilot_backend = os.environ.get(self.__copilot_backend_env_var, 'gemini')
+        self.__copilot_timeout_env_var = 'TETRIS_COPILOT_TIMEOUT_S'
+        self.__copilot_timeout_s = float(os.environ.get(self.__copilot_timeout_env_var, 10))
+        self.__copilot_encoding_env_var = 'TETRIS_COPILOT_ENCODING'
+        self.__copilot_encoding = os.environ.get(self.__copilot_encoding_env_var, 'chars')
+        self.__copilot_cache_env_var = 'TETRIS_COPILOT_CACHE'
+        self.__copilot_cache_path = os.environ.get(self.__copilot_cache_env_var)
+        self.__copilot_weights_env_var = 'TETRIS_COPILOT_WEIGHTS'
+        self.__copilot_weights_path = os.environ.get(self.__copilot_weights_env_var)
+        self.__copilot_trace_env_var = 'TETRIS_COPILOT_TRACE'
+        self.__copilot_trace_path = os.environ.get(self.__copilot_trace_env_var, 'copilot-trace.jsonl')
+        self.__copilot_trace: JsonlWriter = None     # only the Gemini backend is traced
+        self.__metrics_env_var = 'TETRIS_METRICS'
+        self.__metrics_path = os.environ.get(self.__metrics_env_var, 'tetris-metrics')
+        self.__metrics = Metrics()
+        self.__events_env_var = 'TETRIS_EVENTS'
+        self.__events_path = os.environ.get(self.__events_env_var, 'tetris-events.log')
+        self.__trace_env_var = 'TETRIS_TRACE'
+        TRACER.enabled = os.environ.get(self.__trace_env_var, '0') == '1'
+        self.__recording_env_var = 'TETRIS_RECORDING'
+        self.__recording_path = os.environ.get(self.__recording_env_var, 'tetris-last-game.ttr')
+        self.__recording: InputLog = None
+        self.__piece_bag_env_var = 'TETRIS_PIECE_BAG'
+        self.__piece_bag = os.environ.get(self.__piece_bag_env_var, '0') == '1'
+        self.__root.report_callback_exception = self.__report_callback_exception
         self.__init_ai()
         self.__init_ui()
         self.__init_mvc()
+        self.__startup_ms['app_init'] = (time.perf_counter() - self.__init_started) * 1000
 
     def __init_ai(self) -> None:
         logging.info(f'Reading Google AI API key from {self.__google_ai_api_key_env_var} environment variable...')
@@ -77,20 +114,17 @@ class App(object):
         self.__mainframe.pack()
         logging.info('Init UI components - done.')
 
-    def __push_down_timer(self) -> None:
-        self.__pausable(self.__ctr.push_down)
-        self.__root.after(self.__ctr.get_push_down_interval_ms(), self.__push_down_timer)
-
     def __flight_execution_timer(self) -> None:
         if self.__copilot_is_active:
-            self.__pausable(self.__copilot.execute_flight)
-        self.__root.after(self.__copilot.get_flight_execution_interval_ms(), self.__flight_execution_timer)
+            self.__copilot.execute_flight()
 
     def __toggle_copilot(self) -> None:
         self.__copilot_is_active = not self.__copilot_is_active
         logging.info(f'AI Co-pilot status is {"on" if self.__copilot_is_active else "off"}')
         try:
-            if self.__copilot_is_active and self.__google_ai_api_key is None:
+            if self.__copilot_is_active and not self.__load_copilot():
+                return
+            if self.__copilot_is_active and self.__copilot.needs_api_key() and self.__google_ai_api_key is None:
                 self.__pause(True)
                 try:
                     ### TODO: remove
@@ -109,29 +143,106 @@ class App(object):
                 finally:
                     self.__pause(False)
         finally:
+            if not self.__copilot_is_active:
+                self.__copilot.cancel()
             self.__copilotbutton.config(relief="sunken" if self.__copilot_is_active else "raised")
 
+    def __load_copilot(self) -> bool:
+        "Loads the co-pilot backend on the first use. Turns the co-pilot off and returns False if it can not be loaded."
+        was_paused = self.__game_paused
+        self.__pause(True)
+        try:
+            self.__copilot.load()
+            return True
+        except ImportError as e:
+            logging.error(f'AI co-pilot backend can not be loaded: {e}')
+            messagebox.showinfo('Tetris AI Co-pilot', f'Sorry, can not turn on AI co-pilot: {e}. Install the Python modules (see README.md) or set {self.__copilot_backend_env_var}=local.')
+            self.__copilot_is_active = False
+            return False
+        finally:
+            self.__pause(was_paused)
+
+    def __render(self) -> bool:
+        rendered = self.__ctr.render()
+        if rendered and self.__startup_ms is not None:
+            self.__root.update_idletasks()      # the first frame is on the screen
+            self.__report_startup()
+        return rendered
+
+    def __report_startup(self) -> None:
+        startup_ms = self.__startup_ms
+        startup_ms['first_frame'] = (time.perf_counter() - self.__init_started) * 1000 - startup_ms['app_init']
+        total_ms = sum(startup_ms.values())
+        self.__startup_ms = None
+        report = ', '.join(f'{name} {ms:.0f}ms' for (name, ms) in startup_ms.items())
+        (logging.warning if total_ms > 1000 else logging.info)(f'Startup took {total_ms:.0f}ms: {report}')
+
     def __toggle_pause(self) -> None:
         self.__game_paused = not self.__game_paused
         logging.info(f'Pause the game {self.__game_paused}')
         self.__pausebutton.config(relief="sunken" if self.__game_paused else "raised")
+        if not self.__game_paused:
+            self.__loop.wake()
 
     def __pause(self, pause: bool) -> None:
         if pause != self.__game_paused:
             self.__toggle_pause()
 
     def __restart(self) -> None:
+        self.__save_recording()
         self.__game_over = False
         self.__ctr.reset()
+        self.__start_recording()
+        self.__loop.wake()
 
-    def __pausable(self, func):
-        if self.__game_paused or self.__game_over:
-            logging.debug(f'Game {"paused" if self.__game_paused else "over"}')
+    def __start_recording(self) -> None:
+        game = self.__ctr.get_game()
+        self.__recording = InputLog(game.get_board().get_rows(), game.get_board().get_cols(), game.get_seed(),
+                                    game.get_queue().is_bag())
+        self.__ctr.set_input_listener(self.__recording.append)
+
+    def __save_recording(self) -> None:
+        "Keeps the recording of the current game, replay it with `python replay.py <path>`."
+        if self.__recording and self.__recording.get_events():
+            self.__recording.save(self.__recording_path)
+            logging.info(f'The game recording is saved to {self.__recording_path}')
+
+    def __toggle_metrics(self) -> None:
+        self.__metrics.set_enabled(not self.__metrics.is_enabled())
+        logging.info(f'Metrics are {"on" if self.__metrics.is_enabled() else "off"}')
+
+    def __dump_metrics(self) -> None:
+        "Writes the metrics snapshot as <path>.json and <path>.prom."
+        with open(f'{self.__metrics_path}.json', 'w') as f:
+            f.write(self.__metrics.to_json())
+        with open(f'{self.__metrics_path}.prom', 'w') as f:
+            f.write(self.__metrics.to_prometheus())
+        logging.info(f'Metrics are written to {self.__metrics_path}.json and {self.__metrics_path}.prom')
+
+    def __dump_events(self) -> None:
+        if not TRACER.enabled:
+            logging.info(f'Debug events are not recorded, set {self.__trace_env_var}=1 to record them')
+            return
+        TRACER.dump(self.__events_path)
+        logging.info(f'The last {min(TRACER.get_recorded(), TRACER.get_capacity())} debug events are written to {self.__events_path}')
+
+    def __report_callback_exception(self, exc, val, tb) -> None:
+        logging.error('Exception in Tk callback', exc_info=(exc, val, tb))
+        self.__dump_events()
+
+    def __is_active(self) -> bool:
+        return not self.__game_paused and not self.__game_over
+
+    def __pausable(self, func) -> None:
+        "Queues a player action for the next frame of the game loop."
+        if self.__is_active():
+            self.__loop.push_input(func)
         else:
-            return func()
+            logging.debug(f'Game {"paused" if self.__game_paused else "over"}')
 
     def __set_game_over(self) -> None:
         self.__game_over = True
+        self.__save_recording()
 
     def __init_mvc(self) -> None:
         logging.info('Init MVC components...')
@@ -145,30 +256,59 @@ class App(object):
         # Model
         game = Game(rows=self.__board_rows, cols=self.__board_cols,
                     score_update_callback=lambda score: self.__scorevar.set(score), 
-                    lines_update_callback=lambda lines: self.__linesvar.set(lines))
+                    lines_update_callback=lambda lines: self.__linesvar.set(lines), bag=self.__piece_bag)
 
         # View
         board_view = BoardView(game.get_board(), self.__canvas, self.__cell_size_px)
 
         # Controller
-        self.__ctr = Controller(game, board_view, self.__set_game_over)
+        self.__ctr = Controller(game, board_view, self.__set_game_over, auto_render=False, metrics=self.__metrics)
+        self.__loop = GameLoop(self.__root.after, self.__render, self.__is_active)
         self.__root.bind("<Right>", lambda event: self.__pausable(self.__ctr.move_right))
         self.__root.bind("<Left>", lambda event: self.__pausable(self.__ctr.move_left))
         self.__root.bind("<Up>", lambda event: self.__pausable(self.__ctr.rotate_clockwise))
         self.__root.bind("<Down>", lambda event: self.__pausable(self.__ctr.rotate_counterclockwise))
         self.__root.bind("<space>", lambda event: self.__pausable(self.__ctr.drop))
+        self.__root.bind("<Return>", lambda event: self.__pausable(self.__ctr.hard_drop))
+        self.__root.bind("<F9>", lambda event: self.__toggle_metrics())
+        self.__root.bind("<F10>", lambda event: self.__dump_metrics())
+        self.__root.bind("<F11>", lambda event: self.__dump_events())
 
-        self.__copilot = Copilot(self.__ctr)
+        logging.info(f'AI co-pilot backend is {self.__copilot_backend} (set {self.__copilot_backend_env_var} to change)')
+        backend = self.__copilot_backend
+        if self.__copilot_backend == 'gemini':
+            self.__copilot_trace = JsonlWriter(self.__copilot_trace_path)
+            backend = GeminiBackend(self.__copilot_encoding, self.__copilot_trace)
+        weights = None
+        if self.__copilot_backend in ('local', 'beam') and self.__copilot_weights_path:
+            logging.info(f'Local co-pilot weights are read from {self.__copilot_weights_path}')
+            weights = HeuristicPlanner.load_weights(self.__copilot_weights_path)
+        if self.__copilot_backend == 'local' and weights:
+            backend = LocalBackend(HeuristicPlanner(weights))
+        elif self.__copilot_backend == 'beam':
+            # The search has to be done well before the push-down moves the figure.
+            backend = BeamBackend(BeamSearchPlanner(weights, time_budget_ms=self.__ctr.get_push_down_interval_ms() // 2))
+        self.__copilot = Copilot(self.__ctr, backend, self.__root.after, self.__copilot_timeout_s,
+                                 PlanCache(path=self.__copilot_cache_path))
         
         self.__ctr.start_game(build_flight)
+        self.__start_recording()
 
-        self.__root.after(self.__ctr.get_push_down_interval_ms(), self.__push_down_timer)
-        self.__root.after(self.__copilot.get_flight_execution_interval_ms(), self.__flight_execution_timer)
+        self.__loop.add_timer(self.__ctr.get_push_down_interval_ms, self.__ctr.push_down)
+        self.__loop.add_timer(self.__copilot.get_flight_execution_interval_ms, self.__flight_execution_timer)
+        self.__loop.wake()
         logging.info('Init MVC components - done.')
 
     def run(self) -> None:
         logging.info('Entering mainloop...')
         self.__root.mainloop()
+        self.__save_recording()
+        logging.info(f'Game loop frame stats: {self.__loop.get_frame_stats()}')
+        if self.__metrics.is_enabled():
+            self.__dump_metrics()
+        self.__copilot.shutdown()
+        if self.__copilot_trace:
+            self.__copilot_trace.close()
         logging.info('Exiting mainloop.')
 
 if __name__ == "__main__":
@@ -180,7 +320,7 @@ if __name__ == "__main__":
     logging.info('Starting Tk app...')
 
     win = tk.Tk()
-    app = App(win)
+    app = App(win, {'imports': (IMPORTED - STARTED) * 1000, 'tk_init': (time.perf_counter() - IMPORTED) * 1000})
     app.run()
     
     logging.info('Goodbye!')
@@ -0,0 +1,122 @@
+import bisect, json, threading, time
+
+class Histogram(object):
+    "Latency histogram with fixed buckets, count, sum and max. Values are in seconds."
+    BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+               0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.__counts = [0] * (len(Histogram.BUCKETS) + 1)    # the last one is +Inf
+        self.__count = 0
+        self.__sum = 0.0
+        self.__max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.__counts[bisect.bisect_left(Histogram.BUCKETS, value)] += 1
+        self.__count += 1
+        self.__sum += value
+        if value > self.__max:
+            self.__max = value
+
+    def get_count(self) -> int:
+        return self.__count
+
+    def get_sum(self) -> float:
+        return self.__sum
+
+    def get_max(self) -> float:
+        return self.__max
+
+    def get_bucket_counts(self) -> list[int]:
+        "Non-cumulative counts per bucket, the last one counts the values above the largest bucket."
+        return self.__counts
+
+    def get_quantile(self, q: float) -> float:
+        "Upper bound of the bucket holding the q quantile, the max for the values over the largest bucket."
+        if not self.__count:
+            return 0.0
+        rank = q * self.__count
+        seen = 0
+        for (i, count) in enumerate(self.__counts):
+            seen += count
+            if seen >= rank and count:
+                return min(Histogram.BUCKETS[i], self.__max) if i < len(Histogram.BUCKETS) else self.__max
+        return self.__max
+
+class Metrics(object):
+    """Per-operation counters and latency histograms. Disabled by default - the instrumented code checks
+    is_enabled() before reading the clock, so switching it off leaves a single attribute lookup per operation.
+    Thread-safe, the co-pilot worker thread records its calls while the UI thread takes snapshots."""
+    def __init__(self, enabled: bool = False) -> None:
+        super().__init__()
+        self.__enabled = enabled
+        self.__lock = threading.Lock()
+        self.__histograms: dict[str, Histogram] = {}
+        self.__counters: dict[str, int] = {}
+
+    def is_enabled(self) -> bool:
+        return self.__enabled
+
+    def set_enabled(self, enabled: bool) -> None:
+        self.__enabled = enabled
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__histograms = {}
+            self.__counters = {}
+
+    def observe(self, operation: str, seconds: float) -> None:
+        with self.__lock:
+            histogram = self.__histograms.get(operation)
+            if histogram is None:
+                histogram = self.__histograms[operation] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_since(self, operation: str, start: float) -> None:
+        "Records the time passed since start, a time.perf_counter() value."
+        self.observe(operation, time.perf_counter() - start)
+
+    def count(self, counter: str, n: int = 1) -> None:
+        with self.__lock:
+            self.__counters[counter] = self.__counters.get(counter, 0) + n
+
+    def get_histogram(self, operation: str) -> Histogram:
+        return self.__histograms.get(operation)
+
+    def get_counter(self, counter: str) -> int:
+        return self.__counters.get(counter, 0)
+
+    def snapshot(self) -> dict:
+        "Counters and per-operation latency summaries, milliseconds."
+        with self.__lock:
+            return {
+                'counters': dict(self.__counters),
+                'latency_ms': {operation: {
+                    'count': h.get_count(),
+                    'avg': h.get_sum() * 1000 / h.get_count(),
+                    'p50': h.get_quantile(0.5) * 1000,
+                    'p99': h.get_quantile(0.99) * 1000,
+                    'max': h.get_max() * 1000,
+                } for (operation, h) in sorted(self.__histograms.items())},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = 'tetris') -> str:
+        "Snapshot in the Prometheus text exposition format."
+        lines = [f'# TYPE {prefix}_events_total counter']
+        name = f'{prefix}_operation_latency_seconds'
+        with self.__lock:
+            for (counter, value) in sorted(self.__counters.items()):
+                lines.append(f'{prefix}_events_total{{event="{counter}"}} {value}')
+            lines.append(f'# TYPE {name} histogram')
+            for (operation, h) in sorted(self.__histograms.items()):
+                cumulative = 0
+                for (bound, count) in zip(Histogram.BUCKETS + ('+Inf',), h.get_bucket_counts()):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{operation="{operation}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{operation="{operation}"}} {h.get_sum()}')
+                lines.append(f'{name}_count{{operation="{operation}"}} {h.get_count()}')
+        return '\n'.join(lines) + '\n'
@@ -1,7 +1,8 @@
-import logging
-import random
+import random, struct
 from collections.abc import Callable
 
+from tracing import TRACER, Tracer
+
 class ModelException(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
@@ -15,35 +16,93 @@ class GameOverException(ModelException):
         super().__init__(*args)
 
 class FigureRotation(object):
+    """Immutable, precompiled projection of a piece. Everything the collision, drop and spawn logic needs
+    is calculated once, when the piece table is built, and shared by all the live figures."""
     def __init__(self, layout: list[list[bool]]) -> None:
         super().__init__() 
-        self.__layout = layout
+        self.__layout = tuple(tuple(row) for row in layout)
         self.__cell_coords = self.__calc_cells_coords()
+        self.__row_masks = self.__calc_row_masks()
+        self.__bounding_box = self.__calc_bounding_box()
+        self.__bottom_profile = self.__calc_bottom_profile()
 
-    def __calc_cells_coords(self) -> list[tuple[int, int]]:
+    def __calc_cells_coords(self) -> tuple[tuple[int, int], ...]:
         res = []
         for i in range(len(self.__layout)):
             for j in range(len(self.__layout[i])):
                 if self.__layout[i][j]:
                     res.append((i, j))
-        return res
+        return tuple(res)
 
-    def get_layout(self) -> list[list[bool]]:
+    def __calc_row_masks(self) -> tuple[int, ...]:
+        "Bitmask per layout row, bit N is set when column N of the row is occupied."
+        return tuple(sum(1 << j for j in range(len(row)) if row[j]) for row in self.__layout)
+
+    def __calc_bounding_box(self) -> tuple[int, int, int, int]:
+        rows = [r for (r, _) in self.__cell_coords]
+        cols = [c for (_, c) in self.__cell_coords]
+        return (min(rows), min(cols), max(rows), max(cols))
+
+    def __calc_bottom_profile(self) -> tuple[int, ...]:
+        "The lowest occupied row per layout column, -1 for an empty column."
+        return tuple(max((r for (r, c) in self.__cell_coords if c == col), default=-1)
+                     for col in range(len(self.__layout[0])))
+
+    def get_layout(self) -> tuple[tuple[bool, ...], ...]:
         return self.__layout
     
-    def get_cells_coords(self) -> list[tuple[int, int]]:
+    def get_cells_coords(self) -> tuple[tuple[int, int], ...]:
         return self.__cell_coords
+
+    def get_row_masks(self) -> tuple[int, ...]:
+        return self.__row_masks
+
+    def get_bounding_box(self) -> tuple[int, int, int, int]:
+        "Occupied area of the layout as (min row, min col, max row, max col)."
+        return self.__bounding_box
+
+    def get_min_col(self) -> int:
+        "Leftmost occupied column of the layout (some rotations have empty leading columns)."
+        return self.__bounding_box[1]
+
+    def get_max_col(self) -> int:
+        "Rightmost occupied column of the layout."
+        return self.__bounding_box[3]
+
+    def get_bottom_profile(self) -> tuple[int, ...]:
+        return self.__bottom_profile
+
+    def get_spawn_col(self, board_cols: int) -> int:
+        "Column where the projection appears on a board of the given width."
+        return (board_cols - len(self.__layout[0])) // 2
     
 class Figure(object):
-    def __init__(self, projections: list[FigureRotation], current_projection: int) -> None:
+    """A live piece - a reference to the shared immutable projections plus its own rotation state,
+    so any number of figures of the same kind can be rotated independently."""
+    def __init__(self, projections: tuple[FigureRotation, ...], current_projection: int, kind: int = -1) -> None:
         super().__init__()
         assert 0 <= len(projections) <= 4 
         assert 0 <= current_projection < len(projections)
-        self.__projections = projections
+        self.__projections = tuple(projections)
         self.__current_projection = current_projection
+        self.__kind = kind
+
+    def get_kind(self) -> int:
+        "Index of the piece in FigureFactory.FIGURES (-1 for a figure built outside of the factory)."
+        return self.__kind
+
+    def clone(self) -> 'Figure':
+        "Same kind and rotation, independent rotation state."
+        return Figure(self.__projections, self.__current_projection, self.__kind)
 
-    def get_projection_count(self) -> None:
+    def get_projection_count(self) -> int:
         return len(self.__projections)
+
+    def get_projection_idx(self) -> int:
+        return self.__current_projection
+
+    def get_projection(self, idx: int) -> FigureRotation:
+        return self.__projections[idx]
     
     def get_current_projection(self) -> FigureRotation:
         return self.__projections[self.__current_projection]
@@ -59,8 +118,9 @@ class Figure(object):
             self.__current_projection = 0
 
 class FigureFactory(object):
-    FIGURES = [
-        Figure([
+    # Compiled once - a tuple of immutable projections per piece kind.
+    FIGURES = (
+        (
             FigureRotation([
                 [True, True],
                 [True, False]]),
@@ -73,8 +133,8 @@ class FigureFactory(object):
                 FigureRotation([
                 [True, False],
                 [True, True]])
-        ], 0),
-        Figure([
+        ),
+        (
             FigureRotation([
                 [True, True, False],
                 [False, True, True]]),
@@ -82,8 +142,8 @@ class FigureFactory(object):
                 [False, True],
                 [True, True],
                 [True, False]])
-        ], 0),
-        Figure([
+        ),
+        (
             FigureRotation([
                 [False, True, True],
                 [True, True, False]]),
@@ -91,8 +151,8 @@ class FigureFactory(object):
                 [True, False],
                 [True, True],
                 [False, True]])
-        ], 0),
-        Figure([
+        ),
+        (
             FigureRotation([
                 [True, True, True, True]]),
             FigureRotation([
@@ -100,13 +160,13 @@ class FigureFactory(object):
                 [False, True],
                 [False, True],
                 [False, True]])
-        ], 0),
-        Figure([
+        ),
+        (
             FigureRotation([
                 [True, True],
-                [True, True]])
-        ], 0),
-        Figure([
+                [True, True]]),
+        ),
+        (
             FigureRotation([
                 [False, True, False],
                 [True, True, True]]),
@@ -121,8 +181,8 @@ class FigureFactory(object):
                 [False, False, True],
                 [False, True, True],
                 [False, False, True]])
-        ], 0),
-        Figure([
+        ),
+        (
             FigureRotation([
                 [True, True, True],
                 [True, False, False]]),
@@ -137,8 +197,8 @@ class FigureFactory(object):
                 [True, False, False],
                 [True, False, False],
                 [True, True, False]])
-        ], 0),
-        Figure([
+        ),
+        (
             FigureRotation([
                 [True, True, True],
                 [False, False, True],
@@ -154,15 +214,81 @@ class FigureFactory(object):
                 [True, True, False],
                 [True, False, False],
                 [True, False, False]])
-        ], 0),
-    ]
+        ),
+    )
+
+    @classmethod
+    def get_random(cls, rng: random.Random = random) -> Figure:
+        kind = rng.randrange(len(cls.FIGURES))
+        return cls.get(kind, rng.randrange(len(cls.FIGURES[kind])))
 
     @classmethod
-    def get_random(cls) -> Figure:
-        figure = random.choice(cls.FIGURES)
-        for _ in range(random.randrange(figure.get_projection_count())):
-            figure.rotate_clockwise()
-        return figure
+    def get(cls, kind: int, projection: int = 0) -> Figure:
+        "Returns a new figure of the given kind - figures never share the rotation state."
+        return Figure(cls.FIGURES[kind], projection, kind)
+
+class FigureQueue(object):
+    """The upcoming figures, drawn size figures ahead of the current one so they can be previewed. A figure is
+    drawn only when one is taken, so peeking never changes the sequence. In bag mode the kinds are dealt from
+    shuffled bags holding every kind once (the 7-bag of the classic set, there are 8 kinds here) - no kind is
+    missing for more than 14 figures in a row."""
+    def __init__(self, rng: random.Random, size: int = 3, bag: bool = False) -> None:
+        super().__init__()
+        assert 0 < size < 256
+        self.__rng = rng
+        self.__bag = bag
+        self.__bag_kinds: list[int] = []
+        self.__figures = [self.__draw() for _ in range(size)]
+
+    def __draw(self) -> Figure:
+        if not self.__bag:
+            return FigureFactory.get_random(self.__rng)
+        if not self.__bag_kinds:
+            self.__bag_kinds = list(range(len(FigureFactory.FIGURES)))
+            self.__rng.shuffle(self.__bag_kinds)
+        kind = self.__bag_kinds.pop()
+        return FigureFactory.get(kind, self.__rng.randrange(len(FigureFactory.FIGURES[kind])))
+
+    def get_size(self) -> int:
+        return len(self.__figures)
+
+    def is_bag(self) -> bool:
+        return self.__bag
+
+    def next(self) -> Figure:
+        "Takes the first figure and draws one more."
+        self.__figures.append(self.__draw())
+        return self.__figures.pop(0)
+
+    def clone(self, rng: random.Random) -> 'FigureQueue':
+        "Copy of the queue drawing from the given generator."
+        queue = object.__new__(FigureQueue)
+        queue.__rng = rng
+        queue.__bag = self.__bag
+        queue.__bag_kinds = list(self.__bag_kinds)
+        queue.__figures = [figure.clone() for figure in self.__figures]
+        return queue
+
+    def peek(self, n: int = 1) -> list[Figure]:
+        "Copies of the next n figures (at most size), the first one is returned by the next next()."
+        return [figure.clone() for figure in self.__figures[:n]]
+
+    def to_bytes(self) -> bytes:
+        "The queued figures and the rest of the bag, the generator is saved by the owner."
+        data = bytearray([len(self.__figures)])
+        for figure in self.__figures:
+            data += bytes((figure.get_kind(), figure.get_projection_idx()))
+        data.append(len(self.__bag_kinds))
+        return bytes(data + bytes(self.__bag_kinds))
+
+    def restore(self, data: bytes, offset: int = 0) -> int:
+        "Sets the queue to a to_bytes() snapshot. Returns the offset after the snapshot."
+        count = data[offset]
+        self.__figures = [FigureFactory.get(data[offset + 1 + 2 * i], data[offset + 2 + 2 * i]) for i in range(count)]
+        offset += 1 + 2 * count
+        count = data[offset]
+        self.__bag_kinds = list(data[offset + 1:offset + 1 + count])
+        return offset + 1 + count
 
 class Cell(object):
     """Represents a cell on the board. This is a bridge model to straigh the interfacing with the View."""
@@ -195,11 +321,22 @@ class Cell(object):
             raise ValueError(f'Cell object can be compared only to the same type object.')
 
 class Board(object):
-    def __init__(self, rows: int, cols: int, cells = []) -> None:
+    """The well. Occupancy is kept as one integer bitmask per row (bit N stands for column N),
+    so collision checks are a few AND operations. Every row also carries its fill count and the cell styles,
+    so line completion is detected on the touched rows only and row removal just shifts the row storage.
+    The column heights (skyline) give the landing row of a figure without stepping it down row by row."""
+    VACANT = 0xFF   # style byte of an empty cell
+
+    def __init__(self, rows: int, cols: int, cells: list[Cell] = None) -> None:
         super().__init__()
         self.__rows = rows
         self.__cols = cols
-        self.__cells: list[Cell] = cells
+        self.reset()
+        if cells:
+            self.figure_final_placement(cells)
+
+    def __new_row_styles(self) -> bytearray:
+        return bytearray([Board.VACANT]) * self.__cols
 
     def get_rows(self):
         return self.__rows
@@ -208,50 +345,185 @@ class Board(object):
         return self.__cols
 
     def get_cells(self) -> list[Cell]:
-        return self.__cells
+        "Settled cells, top to bottom, left to right. The list is built on request."
+        cells = []
+        for row in range(self.__rows):
+            if self.__row_fill[row]:
+                styles = self.__row_styles[row]
+                cells.extend(Cell(row, col, styles[col]) for col in range(self.__cols) if styles[col] != Board.VACANT)
+        return cells
+
+    def get_row_masks(self) -> list[int]:
+        return self.__row_masks
+
+    def get_row_fill(self) -> list[int]:
+        "Number of occupied cells per row."
+        return self.__row_fill
+
+    def get_col_heights(self) -> list[int]:
+        "Height of the topmost occupied cell per column, 0 for an empty column."
+        return self.__col_heights
     
     def get_layout(self, figure_cells: list[Cell] = []) -> list[list[bool]]:
-        result = [[False] * self.__cols for _ in range(self.__rows)]
-        for cell in (self.__cells + figure_cells):
+        result = [[bool(mask >> col & 1) for col in range(self.__cols)] for mask in self.__row_masks]
+        for cell in figure_cells:
             result[cell.get_row()][cell.get_col()] = True
         return result
     
     def is_cell_occupied(self, row, col) -> bool:
-        # TODO: Optimize - some sort of topology-based index is needed
-        return next((c for c in self.__cells if c.get_row() == row and c.get_col() == col), None) is not None
+        if 0 <= row < self.__rows and 0 <= col < self.__cols:
+            return bool(self.__row_masks[row] >> col & 1)
+        return False
     
     def check_fit(self, figure: Figure, row: int, col: int) -> bool:
-        rel_coords = figure.get_current_projection().get_cells_coords()
-        abs_coords = [(r + row, c + col) for (r, c) in rel_coords]
-        if not all([0 <= r < self.__rows and 0 <= c < self.__cols for (r, c) in abs_coords]):
+        projection = figure.get_current_projection()
+        figure_masks = projection.get_row_masks()
+        if row < 0 or row + len(figure_masks) > self.__rows:
             return False
-        target_cells_empty = [not self.is_cell_occupied(r, c) for (r, c) in abs_coords]
-        return all(target_cells_empty)
-
-    def figure_final_placement(self, cells: list[Cell]) -> None:
-        self.__cells.extend(cells)
-        logging.debug(f'New board state {self.__cells}')
+        if col + projection.get_min_col() < 0 or col + projection.get_max_col() >= self.__cols:
+            return False
+        board_masks = self.__row_masks
+        for i in range(len(figure_masks)):
+            # Negative col is legit for layouts with empty leading columns, the shifted-out bits are all zeros.
+            mask = figure_masks[i] << col if col >= 0 else figure_masks[i] >> -col
+            if board_masks[row + i] & mask:
+                return False
+        return True
+
+    def get_landing_row(self, figure: Figure, row: int, col: int) -> int:
+        "The lowest row the figure gets to if dropped from the given position."
+        bottom_profile = figure.get_current_projection().get_bottom_profile()
+        landing_row = self.__rows
+        for i in range(len(bottom_profile)):
+            if bottom_profile[i] < 0:
+                continue
+            surface_row = self.__rows - self.__col_heights[col + i]
+            if row + bottom_profile[i] >= surface_row:
+                # The figure is under an overhang, the skyline does not help - step it down.
+                while self.check_fit(figure, row + 1, col):
+                    row += 1
+                return row
+            landing_row = min(landing_row, surface_row - 1 - bottom_profile[i])
+        return landing_row
+
+    def figure_final_placement(self, cells: list[Cell]) -> list[int]:
+        "Settles the cells on the board. Returns the rows completed by them."
+        touched_rows = set()
+        for cell in cells:
+            (row, col) = (cell.get_row(), cell.get_col())
+            if not self.__row_masks[row] >> col & 1:
+                self.__row_masks[row] |= 1 << col
+                self.__row_fill[row] += 1
+                self.__col_heights[col] = max(self.__col_heights[col], self.__rows - row)
+            self.__row_styles[row][col] = cell.get_style_idx()
+            touched_rows.add(row)
+        completed_rows = [row for row in touched_rows if self.__row_fill[row] == self.__cols]
+        self.__completed_rows.update(completed_rows)
+        if TRACER.enabled:
+            TRACER.record(Tracer.PLACEMENT, len(cells), min(touched_rows, default=-1), len(completed_rows))
+        return sorted(completed_rows)
 
     def get_completed_rows(self) -> list[int]:
-        layout = self.get_layout()
-        return [row for row in range(len(layout)) if all(layout[row])]
+        return sorted(self.__completed_rows)
     
     def remove_rows(self, rows: list[int]) -> None:
-        self.__cells = [cell for cell in self.__cells if cell.get_row() not in rows]
-        for cell in self.__cells:
-            cell.set_row(cell.get_row() + len([r for r in rows if cell.get_row() < r]))
+        removed = sorted(set(rows))
+        if TRACER.enabled:
+            TRACER.record(Tracer.CLEAR, removed)
+        for row in reversed(removed):
+            del self.__row_masks[row]
+            del self.__row_fill[row]
+            del self.__row_styles[row]
+        self.__row_masks[0:0] = [0] * len(removed)
+        self.__row_fill[0:0] = [0] * len(removed)
+        self.__row_styles[0:0] = [self.__new_row_styles() for _ in removed]
+        self.__completed_rows = {row for row in range(self.__rows) if self.__row_fill[row] == self.__cols}
+        self.__calc_col_heights()
+
+    def __calc_col_heights(self) -> None:
+        self.__col_heights = [0] * self.__cols
+        seen = 0
+        for row in range(self.__rows):
+            new = self.__row_masks[row] & ~seen
+            while new:
+                lowest = new & -new
+                self.__col_heights[lowest.bit_length() - 1] = self.__rows - row
+                new ^= lowest
+            seen |= self.__row_masks[row]
 
     def reset(self):
-        self.__cells = []
+        self.__row_masks: list[int] = [0] * self.__rows
+        self.__row_fill: list[int] = [0] * self.__rows
+        self.__row_styles: list[bytearray] = [self.__new_row_styles() for _ in range(self.__rows)]
+        self.__completed_rows: set[int] = set()
+        self.__col_heights: list[int] = [0] * self.__cols
+
+    def __get_masks_format(self) -> str:
+        "The row masks are packed as one struct of 1, 2, 4 or 8 bytes per row. None for boards over 64 columns."
+        width = (self.__cols + 7) // 8
+        code = next((code for (size, code) in ((1, 'B'), (2, 'H'), (4, 'I'), (8, 'Q')) if width <= size), None)
+        return f'<{self.__rows}{code}' if code else None
+
+    def to_bytes(self) -> bytes:
+        "Compact snapshot - rows and cols, the packed row masks, the cell styles."
+        fmt = self.__get_masks_format()
+        if fmt is None:
+            width = (self.__cols + 7) // 8
+            masks = b''.join(mask.to_bytes(width, 'little') for mask in self.__row_masks)
+        else:
+            masks = struct.pack(fmt, *self.__row_masks)
+        return b''.join([struct.pack('<HH', self.__rows, self.__cols), masks] + self.__row_styles)
+
+    def restore(self, data: bytes, offset: int = 0) -> int:
+        "Sets the board to a to_bytes() snapshot at the offset of data, O(rows). Returns the offset after it."
+        (rows, cols) = struct.unpack_from('<HH', data, offset)
+        if (rows, cols) != (self.__rows, self.__cols):
+            raise ModelException(f'A {rows}x{cols} board snapshot does not fit {self.__rows}x{self.__cols} board.')
+        fmt = self.__get_masks_format()
+        pos = offset + 4
+        if fmt is None:
+            width = (cols + 7) // 8
+            self.__row_masks = [int.from_bytes(data[p:p + width], 'little') for p in range(pos, pos + rows * width, width)]
+            pos += rows * width
+        else:
+            self.__row_masks = list(struct.unpack_from(fmt, data, pos))
+            pos += struct.calcsize(fmt)
+        self.__row_styles = [bytearray(data[p:p + cols]) for p in range(pos, pos + rows * cols, cols)]
+        self.__row_fill = [mask.bit_count() for mask in self.__row_masks]
+        self.__completed_rows = {row for row in range(rows) if self.__row_fill[row] == cols}
+        self.__calc_col_heights()
+        return pos + rows * cols
+
+    @staticmethod
+    def from_bytes(data: bytes, offset: int = 0) -> 'Board':
+        board = Board(*struct.unpack_from('<HH', data, offset))
+        board.restore(data, offset)
+        return board
+
+    def clone(self) -> 'Board':
+        "Independent copy of the board, O(rows) - the rows are copied, not reset and overwritten."
+        board = object.__new__(Board)
+        board.__rows = self.__rows
+        board.__cols = self.__cols
+        board.__row_masks = list(self.__row_masks)
+        board.__row_fill = list(self.__row_fill)
+        board.__row_styles = list(map(bytearray.copy, self.__row_styles))
+        board.__completed_rows = set(self.__completed_rows)
+        board.__col_heights = list(self.__col_heights)
+        return board
 
 # TODO: This class has a lot of state (Figure + its position + Board) and movement functionality, makes sense to split.
 class FigureRendering(object):
-    def __init__(self, board: Board, figure: Figure, style_idx: int) -> None:
+    def __init__(self, board: Board, figure: Figure, style_idx: int, position: tuple[int, int] = None) -> None:
+        "Puts the figure at the given (row, col) position, or where a new figure appears if no position is given."
         super().__init__()
         self.__board = board
         self.__figure = figure
-        self.__col = int((board.get_cols() - len(figure.get_current_projection().get_layout()[0])) / 2)    # where a figure appears
-        self.__row = 0
+        if position:
+            (self.__row, self.__col) = position
+        else:
+            self.__col = figure.get_current_projection().get_spawn_col(board.get_cols())    # where a figure appears
+            self.__row = 0
         self.__style_idx = style_idx
         if not self.__board.check_fit(self.__figure, self.__row, self.__col):
             raise GameOverException(f'Impossible to put new figure on the board.')
@@ -267,6 +539,13 @@ class FigureRendering(object):
     
     def get_figure(self) -> Figure:
         return self.__figure
+
+    def get_style_idx(self) -> int:
+        return self.__style_idx
+
+    def clone(self) -> 'FigureRendering':
+        "Independent copy of the figure in its position on a copy of the board, safe to hand over to another thread."
+        return FigureRendering(self.__board.clone(), self.__figure.clone(), self.__style_idx, (self.__row, self.__col))
     
     def move_left(self) -> None:
         if self.__board.check_fit(self.__figure, self.__row, self.__col - 1):
@@ -286,6 +565,17 @@ class FigureRendering(object):
         else:
             raise InvalidMoveException(f'Figure does not fit if moved down.')
 
+    def landing_row(self) -> int:
+        "Where the figure lands if dropped (the ghost piece row)."
+        return self.__board.get_landing_row(self.__figure, self.__row, self.__col)
+
+    def hard_drop(self) -> int:
+        "Moves the figure straight to its landing row. Returns the number of rows it went down."
+        landing_row = self.landing_row()
+        rows = landing_row - self.__row
+        self.__row = landing_row
+        return rows
+
     def rotate_clockwise(self) -> None:
         self.__figure.rotate_clockwise()
         if not self.__board.check_fit(self.__figure, self.__row, self.__col):
@@ -308,12 +598,22 @@ class FigureRendering(object):
 
 # TODO: add game level, auto-increment it after every 10 (or ?) lines.
 class Game(object):
+    """Score, lines and the board of a game. All the randomness of the game (figures, styles) comes from its own
+    random generator, so a game is reproduced by its seed and the moves made (see replay.py).
+    The figures come through a FigureQueue, so the next ones are known in advance.
+    to_bytes() and restore() snapshot the whole state, for what-if searches and save games."""
+    HEADER = struct.Struct('<QQQ?')            # score, lines, seed, with generator state
+    RNG_STATE = struct.Struct('<B625I?d')      # random.Random.getstate() - version, 625 words, gauss_next
     def __init__(self, rows: int, cols: int,
                  score_update_callback: Callable[[int], None] = None, 
-                 lines_update_callback: Callable[[int], None] = None) -> None:
+                 lines_update_callback: Callable[[int], None] = None, seed: int = None,
+                 preview_size: int = 3, bag: bool = False) -> None:
         super().__init__()
         self.__score = 0
         self.__lines = 0
+        self.__seed = seed if seed is not None else random.getrandbits(32)
+        self.__rng = random.Random(self.__seed)
+        self.__queue = FigureQueue(self.__rng, preview_size, bag)
         self.__board = Board(rows, cols)
         self.__score_update_callback = score_update_callback
         self.__lines_update_callback = lines_update_callback
@@ -331,6 +631,15 @@ class Game(object):
     def get_board(self) -> Board:
         return self.__board
 
+    def get_seed(self) -> int:
+        return self.__seed
+
+    def get_rng(self) -> random.Random:
+        return self.__rng
+
+    def get_queue(self) -> FigureQueue:
+        return self.__queue
+
     def get_score(self) -> int:
         return self.__score
     
@@ -341,10 +650,59 @@ class Game(object):
         self.__set_score(self.__score + number_of_rows * 100)
         self.__set_lines(self.__lines + number_of_rows)
 
-    def score_move_down(self) -> None:
-        self.__set_score(self.__score + 1)
-
-    def reset(self) -> None:
+    def score_move_down(self, rows: int = 1) -> None:
+        self.__set_score(self.__score + rows)
+
+    def to_bytes(self, with_rng: bool = False) -> bytes:
+        """Snapshot of the score, lines, seed and board. The generator state and the figure queue add 2.5KB - they
+        are needed only if the restored game has to draw the same figures, like a save game does."""
+        data = Game.HEADER.pack(self.__score, self.__lines, self.__seed, with_rng)
+        if with_rng:
+            (version, state, gauss_next) = self.__rng.getstate()
+            data += Game.RNG_STATE.pack(version, *state, gauss_next is not None, gauss_next or 0.0)
+            data += self.__queue.to_bytes()
+        return data + self.__board.to_bytes()
+
+    def restore(self, data: bytes, offset: int = 0) -> int:
+        """Sets the game to a to_bytes() snapshot, the callbacks get the restored score and lines. The generator
+        and the queue are left as they are if the snapshot has no state of them.
+        Returns the offset after the snapshot."""
+        (score, lines, seed, with_rng) = Game.HEADER.unpack_from(data, offset)
+        offset += Game.HEADER.size
+        if with_rng:
+            (version, *state, has_gauss, gauss_next) = Game.RNG_STATE.unpack_from(data, offset)
+            self.__rng.setstate((version, tuple(state), gauss_next if has_gauss else None))
+            offset = self.__queue.restore(data, offset + Game.RNG_STATE.size)
+        offset = self.__board.restore(data, offset)
+        self.__seed = seed
+        self.__set_score(score)
+        self.__set_lines(lines)
+        return offset
+
+    def clone(self, with_rng: bool = False) -> 'Game':
+        """Copy of the game with its own board, without the callbacks. The generator (a 2.5KB state) is copied
+        only with_rng, otherwise the clone shares the generator and the figure queue with the game - fine for
+        searches that do not draw figures, a clone drawing figures changes the ones the game gets."""
+        game = object.__new__(Game)
+        game.__score = self.__score
+        game.__lines = self.__lines
+        game.__seed = self.__seed
+        game.__board = self.__board.clone()
+        game.__score_update_callback = None
+        game.__lines_update_callback = None
+        if with_rng:
+            game.__rng = random.Random.__new__(random.Random)   # not seeded, the state is set right away
+            game.__rng.setstate(self.__rng.getstate())
+            game.__queue = self.__queue.clone(game.__rng)
+        else:
+            (game.__rng, game.__queue) = (self.__rng, self.__queue)
+        return game
+
+    def reset(self, seed: int = None) -> None:
+      "Starts a new game. Without a seed the next one is drawn from the game generator, a seeded run stays seeded."
+      self.__seed = seed if seed is not None else self.__rng.getrandbits(32)
+      self.__rng = random.Random(self.__seed)
+      self.__queue = FigureQueue(self.__rng, self.__queue.get_size(), self.__queue.is_bag())
       self.__set_score(0)
       self.__set_lines(0)
       self.__board.reset()
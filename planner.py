@@ -0,0 +1,283 @@
+import json, random, time
+from collections import OrderedDict
+
+from model import Board, FigureFactory, FigureRotation, FigureRendering
+
+class HeuristicPlanner(object):
+    """Local one-ply placement planner. Every (rotation, column) landing reachable from the current position of
+    the figure is scored by a weighted sum of the resulting board features, the best one is turned into the same
+    list of moves the AI co-pilot answers with."""
+    DEFAULT_WEIGHTS = {
+        'aggregate_height': -0.510066,
+        'lines': 0.760666,
+        'holes': -0.35663,
+        'bumpiness': -0.184483,
+    }
+
+    def __init__(self, weights: dict[str, float] = None) -> None:
+        super().__init__()
+        self.__weights = dict(HeuristicPlanner.DEFAULT_WEIGHTS)
+        if weights:
+            self.__weights.update(weights)
+
+    def get_weights(self) -> dict[str, float]:
+        return self.__weights
+
+    @staticmethod
+    def load_weights(path: str) -> dict[str, float]:
+        "Reads a weights JSON file, as written by tune.py."
+        with open(path) as f:
+            weights = json.load(f)
+        unknown = weights.keys() - HeuristicPlanner.DEFAULT_WEIGHTS.keys()
+        if unknown:
+            raise ValueError(f'Unknown planner weights in {path}: {", ".join(sorted(unknown))}')
+        return {name: float(value) for (name, value) in weights.items()}
+
+    @staticmethod
+    def place(row_masks: list[int], projection: FigureRotation, row: int, col: int, cols: int) -> tuple[list[int], int]:
+        "Puts the figure on a copy of the board masks and removes completed rows. Returns the masks and lines count."
+        masks = list(row_masks)
+        for (i, mask) in enumerate(projection.get_row_masks()):
+            masks[row + i] |= mask << col if col >= 0 else mask >> -col
+        full_mask = (1 << cols) - 1
+        remaining = [mask for mask in masks if mask != full_mask]
+        lines = len(masks) - len(remaining)
+        return ([0] * lines + remaining, lines)
+
+    def evaluate(self, row_masks: list[int], cols: int, lines: int) -> float:
+        rows = len(row_masks)
+        heights = [0] * cols
+        seen = 0
+        holes = 0
+        for (row, mask) in enumerate(row_masks):
+            new = mask & ~seen
+            while new:
+                lowest = new & -new
+                heights[lowest.bit_length() - 1] = rows - row
+                new ^= lowest
+            holes += (seen & ~mask).bit_count()
+            seen |= mask
+        bumpiness = sum(abs(heights[i] - heights[i + 1]) for i in range(cols - 1))
+        w = self.__weights
+        return (w['aggregate_height'] * sum(heights) + w['lines'] * lines
+                + w['holes'] * holes + w['bumpiness'] * bumpiness)
+
+    def get_landings(self, figure_rendering: FigureRendering) -> list[tuple[int, int, int, FigureRotation]]:
+        """Landings reachable by rotating the figure first and shifting it afterwards, as it is done by the moves.
+        Returns (rotation steps, column, landing row, projection) - negative steps are counterclockwise rotations."""
+        board: Board = figure_rendering.get_board()
+        (row, col) = (figure_rendering.get_row(), figure_rendering.get_col())
+        count = figure_rendering.get_figure().get_projection_count()
+        result = []
+        for steps in range(count):
+            if steps > count // 2:
+                steps -= count      # the shortest way is counterclockwise
+            figure = figure_rendering.get_figure().clone()
+            rotated = True
+            for _ in range(abs(steps)):
+                figure.rotate_clockwise() if steps > 0 else figure.rotate_counterclockwise()
+                if not board.check_fit(figure, row, col):
+                    rotated = False
+                    break
+            if not rotated:
+                continue
+            for direction in (-1, 1):
+                c = col if direction < 0 else col + 1
+                while board.check_fit(figure, row, c):
+                    result.append((steps, c, board.get_landing_row(figure, row, c), figure.get_current_projection()))
+                    c += direction
+        return result
+
+    def find_best(self, figure_rendering: FigureRendering) -> tuple[int, int]:
+        "The best landing as (rotation steps, column), None if the figure can not move at all."
+        board = figure_rendering.get_board()
+        (masks, cols) = (board.get_row_masks(), board.get_cols())
+        best = None
+        best_score = None
+        for (steps, col, row, projection) in self.get_landings(figure_rendering):
+            (placed, lines) = HeuristicPlanner.place(masks, projection, row, col, cols)
+            score = self.evaluate(placed, cols, lines)
+            if best_score is None or score > best_score:
+                (best, best_score) = ((steps, col), score)
+        return best
+
+    @staticmethod
+    def to_moves(steps: int, cols_shift: int) -> list[str]:
+        moves = ['rotate clockwise' if steps > 0 else 'rotate counterclockwise'] * abs(steps)
+        moves += ['move right' if cols_shift > 0 else 'move left'] * abs(cols_shift)
+        return moves + ['release']
+
+    def plan(self, figure_rendering: FigureRendering) -> list[str]:
+        best = self.find_best(figure_rendering)
+        if best is None:
+            return ['release']
+        (steps, col) = best
+        return HeuristicPlanner.to_moves(steps, col - figure_rendering.get_col())
+
+class BeamSearchPlanner(HeuristicPlanner):
+    """Lookahead planner. The landings of the current figure are the first level of a beam search, every next level
+    puts the next figure of the preview on the beam_width best boards of the previous one, so a landing is judged by
+    what the following pieces can make of it. Beyond the preview, one more level averages the best landing of every
+    piece kind. The deeper levels drop the figures straight down from the top row.
+
+    Equal boards reached in different ways are merged, boards are identified by a Zobrist hash (XOR of a random key
+    per occupied cell, updated per placement). The board evaluations are kept in a bounded transposition table
+    across decisions - the boards searched for a piece come back at the next decision.
+    The search stops at the time budget and answers with the deepest completed level."""
+    DEFAULT_TIME_BUDGET_MS = 500    # half of the default push-down interval of the Controller
+    NO_LANDING = -1e6               # value of a piece kind that can not be placed any more
+
+    def __init__(self, weights: dict[str, float] = None, beam_width: int = 8, depth: int = 2,
+                 time_budget_ms: int = DEFAULT_TIME_BUDGET_MS, table_size: int = 100000) -> None:
+        super().__init__(weights)
+        self.__beam_width = beam_width
+        self.__depth = depth
+        self.__time_budget_ms = time_budget_ms
+        self.__table_size = table_size
+        self.__table: OrderedDict[int, float] = OrderedDict()
+        self.__table_hits = 0
+        self.__table_misses = 0
+        self.__zobrist: list[list[int]] = []
+        self.__completed_depth = 0
+
+    def __get_zobrist(self, rows: int, cols: int) -> list[list[int]]:
+        if len(self.__zobrist) != rows or len(self.__zobrist[0]) != cols:
+            rnd = random.Random(0)
+            self.__zobrist = [[rnd.getrandbits(64) for _ in range(cols)] for _ in range(rows)]
+            self.__table.clear()
+        return self.__zobrist
+
+    def __hash(self, masks: list[int]) -> int:
+        key = 0
+        for (row, mask) in enumerate(masks):
+            keys = self.__zobrist[row]
+            while mask:
+                lowest = mask & -mask
+                key ^= keys[lowest.bit_length() - 1]
+                mask ^= lowest
+        return key
+
+    def __evaluate_board(self, masks: list[int], cols: int, key: int) -> float:
+        "The board part of the evaluation (lines excluded), through the transposition table."
+        value = self.__table.get(key)
+        if value is not None:
+            self.__table_hits += 1
+            return value
+        self.__table_misses += 1
+        value = self.evaluate(masks, cols, 0)
+        self.__table[key] = value
+        if len(self.__table) > self.__table_size:
+            self.__table.popitem(last=False)
+        return value
+
+    def __child(self, node: tuple, projection: FigureRotation, row: int, col: int, cols: int) -> tuple:
+        "(value, masks, hash, lines, first move) of the node board with the figure put on it."
+        (_, masks, key, lines, first) = node
+        (placed, cleared) = HeuristicPlanner.place(masks, projection, row, col, cols)
+        if cleared:
+            child_key = self.__hash(placed)
+        else:
+            child_key = key
+            for (r, c) in projection.get_cells_coords():
+                child_key ^= self.__zobrist[row + r][col + c]
+        lines += cleared
+        value = self.__evaluate_board(placed, cols, child_key) + self.get_weights()['lines'] * lines
+        return (value, placed, child_key, lines, first)
+
+    @staticmethod
+    def __drop_landings(masks: list[int], cols: int, kind: int) -> list[tuple[FigureRotation, int, int]]:
+        "(projection, row, col) of the figure of the kind rotated at the top row, shifted and dropped straight."
+        rows = len(masks)
+        heights = [0] * cols
+        seen = 0
+        for (row, mask) in enumerate(masks):
+            new = mask & ~seen
+            while new:
+                lowest = new & -new
+                heights[lowest.bit_length() - 1] = rows - row
+                new ^= lowest
+            seen |= mask
+        result = []
+        for projection in FigureFactory.FIGURES[kind]:
+            top_masks = projection.get_row_masks()
+            (_, min_col, _, max_col) = projection.get_bounding_box()
+            profile = projection.get_bottom_profile()
+            def fits_at_top(col: int) -> bool:
+                if col + min_col < 0 or col + max_col >= cols:
+                    return False
+                return not any(masks[i] & (mask << col if col >= 0 else mask >> -col) for (i, mask) in enumerate(top_masks))
+            spawn_col = projection.get_spawn_col(cols)
+            if not fits_at_top(spawn_col):
+                continue
+            for direction in (-1, 1):
+                col = spawn_col if direction < 0 else spawn_col + 1
+                while fits_at_top(col):
+                    row = min(rows - heights[col + i] - 1 - bottom for (i, bottom) in enumerate(profile) if bottom >= 0)
+                    result.append((projection, row, col))
+                    col += direction
+        return result
+
+    def __merge(self, nodes: list[tuple]) -> list[tuple]:
+        "The beam_width best nodes, one per distinct board."
+        best: dict[int, tuple] = {}
+        for node in nodes:
+            if node[2] not in best or node[0] > best[node[2]][0]:
+                best[node[2]] = node
+        return sorted(best.values(), key=lambda node: node[0], reverse=True)[:self.__beam_width]
+
+    def get_table_stats(self) -> dict[str, int]:
+        return {'size': len(self.__table), 'hits': self.__table_hits, 'misses': self.__table_misses}
+
+    def get_depth(self) -> int:
+        "Number of pieces a decision looks at, the current one included."
+        return self.__depth
+
+    def get_completed_depth(self) -> int:
+        "Number of pieces the last decision looked at before it was done or out of time."
+        return self.__completed_depth
+
+    def find_best(self, figure_rendering: FigureRendering, preview: list[int] = ()) -> tuple[int, int]:
+        """The best landing of the figure as (rotation steps, column), None if the figure can not move at all.
+        The preview lists the kinds of the figures coming after it."""
+        deadline = time.perf_counter() + self.__time_budget_ms / 1000 if self.__time_budget_ms else None
+        board: Board = figure_rendering.get_board()
+        (masks, cols) = (list(board.get_row_masks()), board.get_cols())
+        self.__get_zobrist(board.get_rows(), cols)
+        root = (0.0, masks, self.__hash(masks), 0, None)
+        children = [self.__child(root, projection, row, col, cols)[:4] + ((steps, col),)
+                    for (steps, col, row, projection) in self.get_landings(figure_rendering)]
+        if not children:
+            return None
+        beam = self.__merge(children)
+        self.__completed_depth = 1
+        for depth in range(1, self.__depth):
+            expected = depth > len(preview)     # past the preview - every kind may come
+            kinds = range(len(FigureFactory.FIGURES)) if expected else (preview[depth - 1],)
+            level = []
+            for node in beam:
+                if deadline and time.perf_counter() > deadline:
+                    return beam[0][4]
+                values = []
+                for kind in kinds:
+                    nodes = [self.__child(node, projection, row, col, cols)
+                             for (projection, row, col) in BeamSearchPlanner.__drop_landings(node[1], cols, kind)]
+                    if expected:
+                        values.append(max((child[0] for child in nodes), default=BeamSearchPlanner.NO_LANDING))
+                    else:
+                        level.extend(nodes)
+                if expected:
+                    level.append((sum(values) / len(values),) + node[1:])
+            if not level:
+                break
+            beam = self.__merge(level) if not expected else sorted(level, key=lambda node: node[0], reverse=True)
+            self.__completed_depth = depth + 1
+            if expected:
+                break
+        return beam[0][4]
+
+    def plan(self, figure_rendering: FigureRendering, preview: list[int] = ()) -> list[str]:
+        best = self.find_best(figure_rendering, preview)
+        if best is None:
+            return ['release']
+        (steps, col) = best
+        return HeuristicPlanner.to_moves(steps, col - figure_rendering.get_col())
@@ -0,0 +1,139 @@
+import argparse, logging, sys, time
+from collections.abc import Callable
+
+from simulator import Simulator
+
+class InputLog(object):
+    """Recording of a game - the board size, the game seed, the bag mode of the figure queue and the stream of
+    actions, each stamped with the milliseconds passed since the previous one. Serialized as the MAGIC header,
+    varints of rows, cols, seed and bag, then a single varint per action holding (time delta << 3) | action code, so a move costs 1-2 bytes.
+    Connect append() to Controller.set_input_listener() to record."""
+    MAGIC = b'TTR2'     # TTR1 recordings were made before the figure queue, they draw other figures
+    ACTIONS = Simulator.ACTIONS + ('push_down',)
+    ACTION_BITS = 3
+
+    def __init__(self, rows: int, cols: int, seed: int, bag: bool = False,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        super().__init__()
+        assert len(InputLog.ACTIONS) <= 1 << InputLog.ACTION_BITS
+        self.__rows = rows
+        self.__cols = cols
+        self.__seed = seed
+        self.__bag = bool(bag)
+        self.__clock = clock
+        self.__last_ms = int(clock() * 1000)
+        self.__events: list[tuple[int, int]] = []   # (ms since the previous action, action code)
+        self.__codes = {action: code for (code, action) in enumerate(InputLog.ACTIONS)}
+
+    @staticmethod
+    def __write_varint(out: bytearray, value: int) -> None:
+        while value > 0x7F:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+
+    @staticmethod
+    def __read_varint(data: bytes, pos: int) -> tuple[int, int]:
+        "Returns (value, position after the varint)."
+        (value, shift) = (0, 0)
+        while True:
+            if pos >= len(data):
+                raise ValueError('Truncated recording')
+            byte = data[pos]
+            value |= (byte & 0x7F) << shift
+            pos += 1
+            if byte < 0x80:
+                return (value, pos)
+            shift += 7
+
+    def get_rows(self) -> int:
+        return self.__rows
+
+    def get_cols(self) -> int:
+        return self.__cols
+
+    def get_seed(self) -> int:
+        return self.__seed
+
+    def is_bag(self) -> bool:
+        return self.__bag
+
+    def get_events(self) -> list[tuple[int, str]]:
+        "(ms since the previous action, action name) pairs."
+        return [(delta_ms, InputLog.ACTIONS[code]) for (delta_ms, code) in self.__events]
+
+    def append(self, action: str) -> None:
+        now_ms = int(self.__clock() * 1000)
+        self.__events.append((max(0, now_ms - self.__last_ms), self.__codes[action]))
+        self.__last_ms = now_ms
+
+    def to_bytes(self) -> bytes:
+        out = bytearray(InputLog.MAGIC)
+        for value in (self.__rows, self.__cols, self.__seed, int(self.__bag)):
+            InputLog.__write_varint(out, value)
+        for (delta_ms, code) in self.__events:
+            InputLog.__write_varint(out, delta_ms << InputLog.ACTION_BITS | code)
+        return bytes(out)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'InputLog':
+        if data[:len(InputLog.MAGIC)] != InputLog.MAGIC:
+            raise ValueError('Not a game recording')
+        pos = len(InputLog.MAGIC)
+        header = []
+        for _ in range(4):
+            (value, pos) = InputLog.__read_varint(data, pos)
+            header.append(value)
+        log = InputLog(*header)
+        while pos < len(data):
+            (value, pos) = InputLog.__read_varint(data, pos)
+            code = value & ((1 << InputLog.ACTION_BITS) - 1)
+            if code >= len(InputLog.ACTIONS):
+                raise ValueError(f'Unknown action code {code} in the recording')
+            log.__events.append((value >> InputLog.ACTION_BITS, code))
+        return log
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @staticmethod
+    def load(path: str) -> 'InputLog':
+        with open(path, 'rb') as f:
+            return InputLog.from_bytes(f.read())
+
+def replay(log: InputLog, sim: Simulator = None) -> Simulator:
+    """Plays the recorded actions on a headless simulator as fast as possible, ignoring the timing.
+    A given simulator of the same board size and bag mode is reset to the recorded seed and reused."""
+    if sim is None:
+        sim = Simulator(log.get_rows(), log.get_cols(), seed=log.get_seed(), bag=log.is_bag())
+    else:
+        sim.reset(log.get_seed())
+    for (_, action) in log.get_events():
+        if sim.is_game_over():
+            break
+        if action == 'push_down':
+            sim.tick()
+        else:
+            sim.step(action)
+    return sim
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay a game recording headlessly.')
+    parser.add_argument('recording')
+    parser.add_argument('--repeat', type=int, default=1, help='replay it this many times and report the throughput')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.WARNING)
+    log = InputLog.load(args.recording)
+    sim = Simulator(log.get_rows(), log.get_cols(), seed=log.get_seed(), bag=log.is_bag())
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        replay(log, sim)
+    elapsed = time.perf_counter() - start
+    actions = len(log.get_events())
+    print(f'{log.get_rows()}x{log.get_cols()} seed {log.get_seed()}, {actions} actions: '
+          f'score {sim.get_game().get_score()}, lines {sim.get_game().get_lines()}, '
+          f'{"game over" if sim.is_game_over() else "not finished"}')
+    print(f'{args.repeat} replays in {elapsed:.2f}s: {args.repeat / elapsed:.1f} replays/s, '
+          f'{args.repeat * actions / elapsed:.0f} actions/s')
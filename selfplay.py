@@ -0,0 +1,113 @@
+import argparse, json, logging, os, statistics, sys, time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from planner import BeamSearchPlanner, HeuristicPlanner
+from simulator import Simulator
+from jsonlog import JsonlWriter
+
+def play_planner_game(sim: Simulator, planner: HeuristicPlanner, seed: int, max_pieces: int) -> dict:
+    "Plays one seeded game with the planner placing every figure. Returns the per-game result record."
+    start = time.perf_counter()
+    sim.reset(seed)
+    while not sim.is_game_over() and sim.get_pieces() < max_pieces:
+        best = planner.find_best(sim.get_figure_rendering())
+        if best:
+            (steps, col) = best
+            for _ in range(abs(steps)):
+                sim.step('rotate_clockwise' if steps > 0 else 'rotate_counterclockwise')
+            shift = col - sim.get_figure_rendering().get_col()
+            for _ in range(abs(shift)):
+                sim.step('move_right' if shift > 0 else 'move_left')
+        sim.step('hard_drop')
+    game = sim.get_game()
+    return {
+        'seed': seed,
+        'pieces': sim.get_pieces(),
+        'lines': game.get_lines(),
+        'score': game.get_score(),
+        'game_over': sim.is_game_over(),
+        'duration_s': time.perf_counter() - start,
+    }
+
+PLANNERS = {
+    'heuristic': HeuristicPlanner,
+    'beam': BeamSearchPlanner,
+}
+
+def play_shard(seeds: list[int], rows: int, cols: int, max_pieces: int, weights: dict[str, float] = None,
+               planner: str = 'heuristic') -> list[dict]:
+    "Worker entry point - plays the games of the seeds in this process."
+    sim = Simulator(rows, cols, seed=seeds[0] if seeds else 0)
+    planner = PLANNERS[planner](weights)
+    return [play_planner_game(sim, planner, seed, max_pieces) for seed in seeds]
+
+def play_games(seeds: list[int], rows: int = 25, cols: int = 12, max_pieces: int = 1000,
+               weights: dict[str, float] = None, workers: int = None, shard_size: int = 4,
+               planner: str = 'heuristic') -> Iterator[dict]:
+    """Shards the games across a pool of worker processes (one per core by default) and yields the per-game
+    results as the shards complete. A single worker plays in the calling process."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from play_shard(seeds, rows, cols, max_pieces, weights, planner)
+        return
+    shards = [seeds[i:i + shard_size] for i in range(0, len(seeds), shard_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_shard, shard, rows, cols, max_pieces, weights, planner) for shard in shards]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def summarize(results: list[dict], elapsed_s: float) -> dict:
+    "Aggregate throughput and the score and lines distributions."
+    if not results:
+        return {'games': 0}
+    scores = sorted(result['score'] for result in results)
+    lines = [result['lines'] for result in results]
+    pieces = sum(result['pieces'] for result in results)
+    deciles = statistics.quantiles(scores, n=10) if len(scores) > 1 else [scores[0]] * 9
+    return {
+        'games': len(results),
+        'pieces': pieces,
+        'elapsed_s': elapsed_s,
+        'games_per_s': len(results) / elapsed_s,
+        'pieces_per_s': pieces / elapsed_s,
+        'cpu_s': sum(result['duration_s'] for result in results),
+        'game_overs': sum(1 for result in results if result['game_over']),
+        'score': {'mean': statistics.fmean(scores), 'min': scores[0], 'p10': deciles[0],
+                  'median': statistics.median(scores), 'p90': deciles[-1], 'max': scores[-1]},
+        'lines': {'mean': statistics.fmean(lines), 'max': max(lines)},
+    }
+
+def run(games: int, seed: int = 0, on_result: Callable[[dict], None] = None, **kwargs) -> dict:
+    "Plays the games with the consecutive seeds starting at seed, passes every result to on_result, returns the summary."
+    start = time.perf_counter()
+    results = []
+    for result in play_games(list(range(seed, seed + games)), **kwargs):
+        results.append(result)
+        if on_result:
+            on_result(result)
+    return summarize(results, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Headless self-play of the planners across processes.')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, the next games get seed + 1, ...')
+    parser.add_argument('--rows', type=int, default=25)
+    parser.add_argument('--cols', type=int, default=12)
+    parser.add_argument('--max-pieces', type=int, default=1000, help='a game is stopped after this many pieces')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes, one per core by default')
+    parser.add_argument('--shard-size', type=int, default=4, help='games per task sent to a worker')
+    parser.add_argument('--planner', choices=PLANNERS.keys(), default='heuristic')
+    parser.add_argument('--weights', help='JSON file with the planner weights (see tune.py)')
+    parser.add_argument('--results', help='JSON lines file receiving every game result as it completes')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.WARNING)
+    weights = HeuristicPlanner.load_weights(args.weights) if args.weights else None
+    writer = JsonlWriter(args.results) if args.results else None
+    summary = run(args.games, args.seed, writer.write if writer else None, rows=args.rows, cols=args.cols,
+                  max_pieces=args.max_pieces, weights=weights, workers=args.workers, shard_size=args.shard_size,
+                  planner=args.planner)
+    if writer:
+        writer.close()
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,111 @@
+import argparse, logging, random, struct, sys, time
+from collections.abc import Callable
+
+from model import Game, FigureRendering, GameOverException
+from controller import Controller
+
+class Simulator(object):
+    """Headless game engine - a Controller without a view, no Tk, no timers.
+    The game advances only when step() or tick() is called, so it runs as fast as the CPU allows."""
+    ACTIONS = ('move_left', 'move_right', 'rotate_clockwise', 'rotate_counterclockwise', 'drop', 'hard_drop')
+    STATE = struct.Struct('<II?')   # ticks, pieces, game over
+
+    def __init__(self, rows: int = 25, cols: int = 12,
+                 new_figure_callback: Callable[[FigureRendering], None] = None, seed: int = None,
+                 bag: bool = False) -> None:
+        super().__init__()
+        self.__game = Game(rows, cols, seed=seed, bag=bag)
+        self.__ctr = Controller(self.__game, None, self.__set_game_over)
+        self.__actions = {action: getattr(self.__ctr, action) for action in Simulator.ACTIONS}
+        self.__new_figure_callback = new_figure_callback
+        self.__game_over = False
+        self.__ticks = 0
+        self.__pieces = 0
+        self.__ctr.start_game(self.__on_new_figure)
+
+    def __set_game_over(self) -> None:
+        self.__game_over = True
+
+    def __on_new_figure(self, figure_rendering: FigureRendering) -> None:
+        self.__pieces += 1
+        if self.__new_figure_callback:
+            self.__new_figure_callback(figure_rendering)
+
+    def get_game(self) -> Game:
+        return self.__game
+
+    def get_controller(self) -> Controller:
+        return self.__ctr
+
+    def get_figure_rendering(self) -> FigureRendering:
+        return self.__ctr.get_figure_rendering()
+
+    def get_ticks(self) -> int:
+        return self.__ticks
+
+    def get_pieces(self) -> int:
+        "Number of figures spawned so far."
+        return self.__pieces
+
+    def is_game_over(self) -> bool:
+        return self.__game_over
+
+    def step(self, action: str) -> bool:
+        "Applies one of the ACTIONS to the current figure. Returns False once the game is over."
+        if self.__game_over:
+            raise GameOverException('The game is over, reset the simulator to start a new one.')
+        self.__actions[action]()
+        return not self.__game_over
+
+    def tick(self) -> bool:
+        "Gravity - the system push-down. Returns False once the game is over."
+        if self.__game_over:
+            raise GameOverException('The game is over, reset the simulator to start a new one.')
+        self.__ticks += 1
+        self.__ctr.push_down()
+        return not self.__game_over
+
+    def snapshot(self, with_rng: bool = False) -> bytes:
+        "Compact state of the simulation (see Controller.snapshot) - restore() goes back to it at any time."
+        return Simulator.STATE.pack(self.__ticks, self.__pieces, self.__game_over) + self.__ctr.snapshot(with_rng)
+
+    def restore(self, data: bytes) -> None:
+        (self.__ticks, self.__pieces, self.__game_over) = Simulator.STATE.unpack_from(data)
+        self.__ctr.restore(data, Simulator.STATE.size)
+
+    def reset(self, seed: int = None) -> None:
+        "Starts a new game, with the given seed or the next one of the previous game generator."
+        self.__game_over = False
+        self.__ticks = 0
+        self.__pieces = 0
+        self.__ctr.reset(seed)
+
+def play_random_game(sim: Simulator, max_ticks: int, rnd: random.Random) -> None:
+    "Plays until the game is over (or the tick limit) making a random action before every gravity tick."
+    while sim.get_ticks() < max_ticks:
+        if not sim.step(rnd.choice(Simulator.ACTIONS)) or not sim.tick():
+            break
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Play random headless games and report the throughput.')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=25)
+    parser.add_argument('--cols', type=int, default=12)
+    parser.add_argument('--max-ticks', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bag', action='store_true', help='deal the figures from shuffled bags of all the kinds')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.WARNING)
+    rnd = random.Random(args.seed)
+    sim = Simulator(args.rows, args.cols, seed=args.seed, bag=args.bag)
+    (ticks, pieces) = (0, 0)
+    start = time.perf_counter()
+    for _ in range(args.games):
+        play_random_game(sim, args.max_ticks, rnd)
+        ticks += sim.get_ticks()
+        pieces += sim.get_pieces()
+        sim.reset()
+    elapsed = time.perf_counter() - start
+    print(f'{args.games} games, {ticks} ticks, {pieces} pieces in {elapsed:.2f}s: '
+          f'{args.games / elapsed:.1f} games/s, {ticks / elapsed:.0f} ticks/s')
@@ -0,0 +1,18 @@
+import random
+
+class CellStyles(object):
+    "Cell colors as (fill, outline). Kept apart from view.py, so the headless game picks styles without Tk."
+    STYLES = [
+        ('yellow', 'green'),
+        ('lightgreen', 'blue'),
+        ('steelblue', 'violet'),
+        ('coral3', 'gold4'),
+    ]
+
+    @classmethod
+    def get_random_style_idx(cls, rng: random.Random = random) -> int:
+        return rng.randrange(len(cls.STYLES))
+    
+    @classmethod
+    def get_style(cls, style_idx: int) -> tuple[str, str]:
+        return cls.STYLES[style_idx]
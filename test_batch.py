@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from model import Board, Cell, FigureFactory
+from batch import BatchSimulator
+
+class TestBatchSimulator(unittest.TestCase):
+
+    def __place_on_board(self, board: Board, kind: int, rotation: int, col: int) -> None:
+        figure = FigureFactory.get(kind, rotation)
+        row = 0
+        while board.check_fit(figure, row + 1, col):
+            row += 1
+        cells = [Cell(row + r, col + c, 0) for (r, c) in figure.get_current_projection().get_cells_coords()]
+        board.remove_rows(board.figure_final_placement(cells))
+
+    def test_placements_match_model(self):
+        (rows, cols) = (12, 6)
+        sim = BatchSimulator(64, rows, cols, seed=7)
+        boards = [Board(rows, cols) for _ in range(sim.get_games())]
+        rng = np.random.default_rng(3)
+        for _ in range(30):
+            (kinds, rotations, _, _) = sim.get_figures()
+            targets = rng.integers(-1, cols, size=sim.get_games())
+            before = (kinds.copy(), rotations.copy(), sim.get_alive().copy())
+            placed = sim.place(rotations, targets)
+            for game in np.flatnonzero(placed):
+                self.assertTrue(before[2][game])
+                self.__place_on_board(boards[game], int(before[0][game]), int(before[1][game]), int(targets[game]))
+        for game in range(sim.get_games()):
+            self.assertEqual(sim.get_row_masks(game), boards[game].get_row_masks())
+        self.assertGreater(sim.get_lines().sum(), 0)
+
+    def test_gravity_and_moves(self):
+        sim = BatchSimulator(1000, seed=1)
+        rng = np.random.default_rng(1)
+        while sim.get_alive().any():
+            sim.step(rng.integers(0, 6, size=sim.get_games()))
+            sim.tick()
+        self.assertTrue((sim.get_pieces() > 1).all())
+        self.assertTrue((sim.get_score() >= sim.get_lines() * 100).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+import bench
+
+class TestBench(unittest.TestCase):
+
+    def test_cases_run(self):
+        for (case, name, rows, cols, fill) in bench.get_cases():
+            bench.BENCHMARKS[name](rows, cols, fill)()
+
+    def test_make_board(self):
+        board = bench.make_board(20, 10, 0.5, full_rows=2)
+        self.assertEqual(len(board.get_completed_rows()), 2)
+        self.assertEqual(sum(board.get_row_fill()), 8 * 9 + 2 * 10)
+
+    def test_find_regressions(self):
+        baseline = {'a': 10.0, 'b': 10.0}
+        results = {'a': 12.0, 'b': 13.0, 'c': 100.0}
+        self.assertEqual(bench.find_regressions(results, baseline, 0.25), [('b', 10.0, 13.0)])
+
+if __name__ == '__main__':
+    unittest.main()
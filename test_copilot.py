@@ -0,0 +1,218 @@
+import os, subprocess, sys, tempfile, time
+import unittest
+from copilot import ENCODERS, EXAMPLE_FIGURE, EXAMPLE_WELL, BeamBackend, Copilot, CopilotBackend, PlanCache
+from simulator import Simulator
+
+class FakeScheduler(object):
+    "Tk after() replacement - runs the callbacks on the test thread."
+    def __init__(self) -> None:
+        self.callbacks = []
+
+    def after(self, ms: int, callback) -> None:
+        self.callbacks.append(callback)
+
+    def run_pending(self) -> None:
+        (callbacks, self.callbacks) = (self.callbacks, [])
+        for callback in callbacks:
+            callback()
+
+class FixedBackend(CopilotBackend):
+    def __init__(self, moves: list[str]) -> None:
+        super().__init__()
+        self.moves = moves
+
+    def plan(self, figure_rendering, google_ai_api_key = None) -> list[str]:
+        return self.moves
+
+class RecordingBeamBackend(BeamBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = []     # (kind of the figure, preview) per plan() call
+
+    def plan(self, figure_rendering, google_ai_api_key = None, preview = ()) -> list[str]:
+        self.calls.append((figure_rendering.get_figure().get_kind(), list(preview)))
+        return super().plan(figure_rendering, google_ai_api_key, preview)
+
+class TestCopilot(unittest.TestCase):
+
+    def __wait_for_flight(self, copilot: Copilot, scheduler: FakeScheduler) -> None:
+        deadline = time.monotonic() + 5
+        while copilot.is_building() and time.monotonic() < deadline:
+            time.sleep(0.001)
+            scheduler.run_pending()
+
+    def test_flight_built_off_the_caller_thread(self):
+        sim = Simulator()
+        scheduler = FakeScheduler()
+        copilot = Copilot(sim.get_controller(), 'local', scheduler.after)
+        figure_rendering = sim.get_figure_rendering()
+        copilot.build_flight(figure_rendering)
+        self.assertTrue(copilot.is_building())
+        self.__wait_for_flight(copilot, scheduler)
+        self.assertFalse(copilot.is_building())
+        while sim.get_figure_rendering() is figure_rendering:
+            copilot.execute_flight()
+        self.assertEqual(sim.get_pieces(), 2)
+        copilot.shutdown()
+
+    def test_flight_discarded_when_figure_landed(self):
+        sim = Simulator()
+        scheduler = FakeScheduler()
+        copilot = Copilot(sim.get_controller(), 'local', scheduler.after)
+        copilot.build_flight(sim.get_figure_rendering())
+        sim.step('hard_drop')
+        self.__wait_for_flight(copilot, scheduler)
+        copilot.execute_flight()
+        self.assertEqual(sim.get_figure_rendering().get_row(), 0)   # no moves were made for the new figure
+        copilot.shutdown()
+
+    def test_flight_discarded_when_game_over(self):
+        sim = Simulator(8, 6, seed=0)
+        while True:
+            data = sim.snapshot(with_rng=True)
+            if not sim.step('hard_drop'):
+                break
+        sim.restore(data)   # the last figure of the game
+        scheduler = FakeScheduler()
+        copilot = Copilot(sim.get_controller(), 'local', scheduler.after)
+        copilot.build_flight(sim.get_figure_rendering())
+        sim.step('hard_drop')
+        cells = sim.get_game().get_board().get_cells()
+        self.__wait_for_flight(copilot, scheduler)
+        scheduler.run_pending()
+        copilot.execute_flight()
+        self.assertTrue(sim.is_game_over())
+        self.assertIsNone(sim.get_figure_rendering())
+        self.assertEqual(sim.get_game().get_board().get_cells(), cells)
+        copilot.shutdown()
+
+    def test_next_flight_planned_in_advance(self):
+        sim = Simulator(seed=4)
+        scheduler = FakeScheduler()
+        cache = PlanCache()
+        copilot = Copilot(sim.get_controller(), 'local', scheduler.after, plan_cache=cache)
+        for pieces in range(1, 4):
+            figure_rendering = sim.get_figure_rendering()
+            copilot.build_flight(figure_rendering)
+            self.__wait_for_flight(copilot, scheduler)
+            deadline = time.monotonic() + 5
+            while copilot.is_building_ahead() and time.monotonic() < deadline:
+                time.sleep(0.001)
+                scheduler.run_pending()
+            while sim.get_figure_rendering() is figure_rendering:
+                copilot.execute_flight()
+            self.assertEqual(sim.get_pieces(), pieces + 1)
+        self.assertEqual((cache.get_hits(), cache.get_misses()), (2, 1))
+        copilot.shutdown()
+
+    def __fly(self, sim: Simulator, copilot: Copilot, scheduler: FakeScheduler, pieces: int) -> list[int]:
+        "Lands the pieces with the co-pilot waiting for every build. Returns the kinds of the spawned figures."
+        kinds = []
+        for _ in range(pieces):
+            figure_rendering = sim.get_figure_rendering()
+            kinds.append(figure_rendering.get_figure().get_kind())
+            copilot.build_flight(figure_rendering)
+            deadline = time.monotonic() + 5
+            while (copilot.is_building() or copilot.is_building_ahead()) and time.monotonic() < deadline:
+                time.sleep(0.001)
+                scheduler.run_pending()
+            while sim.get_figure_rendering() is figure_rendering:
+                copilot.execute_flight()
+        return kinds + [sim.get_figure_rendering().get_figure().get_kind()]
+
+    def test_next_flight_planned_with_the_preview(self):
+        sim = Simulator(seed=6)
+        scheduler = FakeScheduler()
+        backend = RecordingBeamBackend()
+        cache = PlanCache()
+        copilot = Copilot(sim.get_controller(), backend, scheduler.after, plan_cache=cache)
+        kinds = self.__fly(sim, copilot, scheduler, 4)
+        # Every figure is planned once - the first at spawn, the next ones in advance - seeing the real next kind.
+        self.assertEqual(backend.calls[:4], [(kinds[i], [kinds[i + 1]]) for i in range(4)])
+        self.assertEqual((cache.get_hits(), cache.get_misses()), (3, 1))
+        copilot.shutdown()
+
+    def test_remote_backend_not_planned_in_advance(self):
+        sim = Simulator(seed=6)
+        scheduler = FakeScheduler()
+        copilot = Copilot(sim.get_controller(), FixedBackend(['release']), scheduler.after, plan_cache=PlanCache())
+        copilot.build_flight(sim.get_figure_rendering())
+        self.__wait_for_flight(copilot, scheduler)
+        self.assertFalse(copilot.is_building_ahead())
+        copilot.shutdown()
+
+    def test_flight_repaired_and_landed_at_once(self):
+        sim = Simulator()
+        copilot = Copilot(sim.get_controller(), FixedBackend(['move left'] * 20 + ['dance', 'release']))
+        copilot.build_flight(sim.get_figure_rendering())
+        copilot.execute_flight()
+        self.assertEqual(sim.get_pieces(), 2)
+        self.assertEqual(min(cell.get_col() for cell in sim.get_game().get_board().get_cells()), 0)
+
+    def test_illegal_flight_rejected(self):
+        sim = Simulator()
+        figure_rendering = sim.get_figure_rendering()
+        for _ in range(sim.get_game().get_board().get_cols()):
+            sim.step('move_left')
+        copilot = Copilot(sim.get_controller(), FixedBackend(['move left'] * 3 + ['release']))
+        copilot.build_flight(figure_rendering)
+        copilot.execute_flight()
+        self.assertIs(sim.get_figure_rendering(), figure_rendering)
+
+    def test_plan_cache_lru(self):
+        cache = PlanCache(max_size=2)
+        cache.put('a', ['release'])
+        cache.put('b', ['move left', 'release'])
+        self.assertEqual(cache.get('a'), ['release'])
+        cache.put('c', ['move right', 'release'])     # evicts "b" - "a" was used more recently
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), ['move right', 'release'])
+        self.assertEqual((cache.get_hits(), cache.get_misses(), cache.get_size()), (2, 1, 2))
+
+    def test_plan_cache_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'plans.sqlite')
+            cache = PlanCache(path=path)
+            sim = Simulator()
+            copilot = Copilot(sim.get_controller(), 'local', plan_cache=cache)
+            key = PlanCache.make_key(sim.get_figure_rendering(), 'LocalBackend')
+            self.assertEqual(key, PlanCache.make_key(sim.get_figure_rendering().clone(), 'LocalBackend'))
+            copilot.build_flight(sim.get_figure_rendering())
+            copilot.shutdown()
+
+            cache = PlanCache(path=path)
+            self.assertIsNotNone(cache.get(key))
+            cache.close()
+
+    def test_plan_cache_persisted_in_lru_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'plans.sqlite')
+            cache = PlanCache(path=path)
+            for key in ('a', 'b', 'c'):
+                cache.put(key, ['release'])
+                time.sleep(0.01)
+            cache.get('a')
+            cache.close()
+
+            cache = PlanCache(max_size=2, path=path)
+            self.assertEqual(('a' in cache, 'b' in cache, 'c' in cache), (True, False, True))
+            cache.close()
+
+    def test_ai_sdk_imported_on_first_use(self):
+        # A fresh interpreter - the SDK may have been imported by another test of this process.
+        code = ('import sys, copilot, simulator; copilot.Copilot(simulator.Simulator().get_controller(), "gemini"); '
+                'sys.exit(copilot.GeminiBackend.SDK in sys.modules)')
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.returncode, 0)
+
+    def test_encoders(self):
+        layout = [[cell == '#' for cell in row] for row in EXAMPLE_WELL]
+        encoded = {name: encoder().encode(layout, EXAMPLE_FIGURE) for (name, encoder) in ENCODERS.items()}
+        self.assertEqual(encoded['chars'].split('\n'), EXAMPLE_WELL)
+        self.assertEqual(encoded['masks'].split('\n')[:2], ['112', '64'])
+        self.assertEqual(encoded['skyline'], '4 2 4 4 4 4 4 4 4 4 4 4\n23:5 24:5\n0:4 0:5 0:6 1:6')
+        self.assertEqual(encoded['words'].split('\n')[-1].split(' ')[5], 'vacant')
+        self.assertLess(len(encoded['chars']), len(encoded['words']) / 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from gameloop import GameLoop
+
+class FakeTk(object):
+    "after() and the clock of the loop - the time moves only when a scheduled callback is run."
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.callbacks = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def after(self, ms: int, callback) -> None:
+        self.callbacks.append((self.now + ms / 1000, callback))
+
+    def run_next(self) -> None:
+        (self.now, callback) = self.callbacks.pop(0)
+        callback()
+
+class TestGameLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.tk = FakeTk()
+        self.active = True
+        self.dirty = False
+        self.renders = 0
+        self.moves = 0
+        self.pushes = 0
+        self.loop = GameLoop(self.tk.after, self.__render, lambda: self.active, 10, self.tk.clock)
+        self.loop.add_timer(lambda: 100, self.__push_down)
+        self.loop.wake()
+
+    def __render(self) -> bool:
+        if not self.dirty:
+            return False
+        (self.dirty, self.renders) = (False, self.renders + 1)
+        return True
+
+    def __move(self) -> None:
+        (self.dirty, self.moves) = (True, self.moves + 1)
+
+    def __push_down(self) -> None:
+        (self.dirty, self.pushes) = (True, self.pushes + 1)
+
+    def test_inputs_coalesced_into_one_render(self):
+        for _ in range(10):
+            self.loop.push_input(self.__move)
+        self.tk.run_next()
+        self.assertEqual((self.moves, self.renders), (10, 1))
+        self.tk.run_next()
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(self.loop.get_frame_stats()['frames'], 2)
+
+    def test_fixed_timestep(self):
+        while self.tk.now < 1.0:
+            self.tk.run_next()
+        self.assertEqual(self.pushes, 10)
+        self.assertEqual(self.renders, 10)
+
+    def test_idle_when_inactive(self):
+        self.active = False
+        self.tk.run_next()
+        self.assertFalse(self.loop.is_running())
+        self.assertEqual(self.tk.callbacks, [])
+        self.loop.push_input(self.__move)
+        self.tk.now = 10.0
+        self.active = True
+        self.loop.wake()
+        self.tk.run_next()
+        self.assertEqual((self.moves, self.pushes), (0, 0))    # no input kept and no catch-up after the pause
+        while self.tk.now < 10.1:
+            self.tk.run_next()
+        self.assertEqual(self.pushes, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import json, os, tempfile
+import unittest
+from jsonlog import JsonlWriter
+
+class TestJsonlWriter(unittest.TestCase):
+
+    def test_records_written_on_close(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.jsonl')
+            writer = JsonlWriter(path, flush_interval_s=60)
+            for i in range(250):
+                writer.write({'request': i, 'latency_ms': 1.5})
+            writer.close()
+            writer.write({'request': 'after close'})
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual([r['request'] for r in records], list(range(250)))
+
+    def test_rotation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.jsonl')
+            writer = JsonlWriter(path, max_bytes=100, backups=2, batch_size=1)
+            for i in range(10):
+                writer.write({'request': i, 'payload': 'x' * 50})
+            writer.close()
+            self.assertEqual(sorted(os.listdir(tmp)), ['trace.jsonl', 'trace.jsonl.1', 'trace.jsonl.2'])
+            with open(path) as f:
+                self.assertEqual(json.loads(f.readlines()[-1])['request'], 9)
+
+if __name__ == '__main__':
+    unittest.main()
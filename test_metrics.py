@@ -0,0 +1,56 @@
+import json, threading
+import unittest
+from metrics import Histogram, Metrics
+from simulator import Simulator
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        h = Histogram()
+        for value in (0.0002, 0.0003, 0.0004, 0.003, 20):
+            h.observe(value)
+        self.assertEqual(h.get_count(), 5)
+        self.assertEqual(h.get_quantile(0.5), 0.0005)
+        self.assertEqual(h.get_quantile(1), 20)
+        self.assertEqual(sum(h.get_bucket_counts()), 5)
+        self.assertEqual(h.get_bucket_counts()[-1], 1)
+
+    def test_disabled_by_default(self):
+        sim = Simulator()
+        sim.step('move_left')
+        sim.step('hard_drop')
+        self.assertEqual(sim.get_controller().get_metrics().snapshot(), {'counters': {}, 'latency_ms': {}})
+
+    def test_recorded_while_snapshotted(self):
+        metrics = Metrics(enabled=True)
+        def record():
+            for i in range(20000):
+                metrics.observe(f'op{i % 500}', 0.001)
+                metrics.count(f'event{i % 500}')
+        worker = threading.Thread(target=record)
+        worker.start()
+        while worker.is_alive():
+            metrics.snapshot()
+            metrics.to_prometheus()
+        worker.join()
+        self.assertEqual(sum(op['count'] for op in metrics.snapshot()['latency_ms'].values()), 20000)
+
+    def test_controller_operations(self):
+        sim = Simulator()
+        metrics = sim.get_controller().get_metrics()
+        metrics.set_enabled(True)
+        for _ in range(20):
+            sim.step('move_left')
+        sim.step('rotate_clockwise')
+        sim.step('hard_drop')
+        sim.tick()
+        snapshot = json.loads(metrics.to_json())
+        self.assertEqual(snapshot['latency_ms']['move']['count'], 20)
+        self.assertGreater(snapshot['counters']['move_blocked'], 0)
+        self.assertEqual({'move', 'rotate', 'hard_drop', 'next_figure', 'drop'}, snapshot['latency_ms'].keys())
+        text = metrics.to_prometheus()
+        self.assertIn('tetris_operation_latency_seconds_count{operation="move"} 20', text)
+        self.assertIn('tetris_operation_latency_seconds_bucket{operation="move",le="+Inf"} 20', text)
+
+if __name__ == '__main__':
+    unittest.main()
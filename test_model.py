@@ -1,6 +1,6 @@
-import copy
+import copy, random
 import unittest
-from model import Cell, Board
+from model import ModelException, Game, Cell, Board, Figure, FigureRotation, FigureFactory, FigureQueue, FigureRendering
 
 class TestModel(unittest.TestCase):
 
@@ -77,5 +77,137 @@ class TestModel(unittest.TestCase):
                                               [False, False, False, False],
                                               [True, False, False, False]])
 
+    def test_row_completion_on_placement(self):
+        board = Board(3, 3, [Cell(2, 0, 1), Cell(2, 1, 2), Cell(1, 0, 3)])
+        self.assertEqual(board.get_completed_rows(), [])
+        self.assertEqual(board.figure_final_placement([Cell(1, 1, 0), Cell(2, 2, 0)]), [2])
+        self.assertEqual(board.get_row_fill(), [0, 2, 3])
+        self.assertEqual(board.get_completed_rows(), [2])
+
+        board.remove_rows([2])
+        self.assertEqual(board.get_completed_rows(), [])
+        self.assertEqual(board.get_row_fill(), [0, 0, 2])
+        self.assertEqual(board.get_cells(), [Cell(2, 0, 3), Cell(2, 1, 0)])
+
+    def test_check_fit(self):
+        board = Board(4, 4, [Cell(3, 0, 0), Cell(3, 1, 0), Cell(2, 3, 0)])
+        self.assertTrue(board.is_cell_occupied(3, 1))
+        self.assertFalse(board.is_cell_occupied(3, 2))
+        self.assertFalse(board.is_cell_occupied(4, 0))
+        figure = Figure([FigureRotation([[False, True],
+                                         [False, True]])], 0)
+        self.assertTrue(board.check_fit(figure, 0, -1))     # empty leading column may stick out of the well
+        self.assertFalse(board.check_fit(figure, 0, -2))
+        self.assertTrue(board.check_fit(figure, 2, 1))
+        self.assertFalse(board.check_fit(figure, 2, 0))
+        self.assertFalse(board.check_fit(figure, 1, 2))
+        self.assertFalse(board.check_fit(figure, 0, 3))
+        self.assertFalse(board.check_fit(figure, 3, 1))
+
+    def test_figures_do_not_share_rotation_state(self):
+        current = FigureFactory.get(5)
+        preview = FigureFactory.get(5)
+        current.rotate_clockwise()
+        self.assertEqual(current.get_projection_idx(), 1)
+        self.assertEqual(preview.get_projection_idx(), 0)
+        self.assertIs(current.get_projection(0), preview.get_current_projection())
+
+    def test_compiled_rotation(self):
+        rotation = FigureRotation([[False, False, True],
+                                   [False, True, True],
+                                   [False, False, True]])
+        self.assertEqual(rotation.get_row_masks(), (4, 6, 4))
+        self.assertEqual(rotation.get_bounding_box(), (0, 1, 2, 2))
+        self.assertEqual(rotation.get_bottom_profile(), (-1, 1, 2))
+        self.assertEqual(rotation.get_spawn_col(12), 4)
+
+    def test_landing_row(self):
+        board = Board(6, 4, [Cell(5, 0, 0), Cell(3, 1, 0), Cell(4, 3, 0)])
+        self.assertEqual(board.get_col_heights(), [1, 3, 0, 2])
+        figure = FigureFactory.get(4)   # O-piece
+        self.assertEqual(board.get_landing_row(figure, 0, 2), 2)
+        self.assertEqual(board.get_landing_row(figure, 0, 0), 1)
+        self.assertEqual(board.get_landing_row(figure, 4, 1), 4)    # under the overhang of column 1
+
+        figure_rendering = FigureRendering(board, figure, 0)
+        self.assertEqual(figure_rendering.landing_row(), 1)
+        figure_rendering.move_right()
+        self.assertEqual(figure_rendering.hard_drop(), 2)
+        self.assertEqual(figure_rendering.get_row(), 2)
+
+        board.remove_rows([4])
+        self.assertEqual(board.get_col_heights(), [1, 2, 0, 0])
+
+    def test_board_snapshot(self):
+        board = Board(6, 10, [Cell(5, col, col % 4) for col in range(10)] + [Cell(4, 9, 2), Cell(2, 1, 3)])
+        data = board.to_bytes()
+        self.assertEqual(len(data), 4 + 6 * 2 + 6 * 10)
+        restored = Board.from_bytes(data)
+        self.assertEqual(restored.get_cells(), board.get_cells())
+        self.assertEqual(restored.get_row_masks(), board.get_row_masks())
+        self.assertEqual(restored.get_col_heights(), board.get_col_heights())
+        self.assertEqual(restored.get_completed_rows(), [5])
+        board.reset()
+        self.assertEqual(board.restore(b'xx' + data, 2), len(data) + 2)
+        self.assertEqual(board.get_cells(), restored.get_cells())
+        self.assertRaises(ModelException, Board(5, 10).restore, data)
+
+    def test_game_snapshot(self):
+        scores = []
+        game = Game(6, 4, lambda score: scores.append(score), seed=5)
+        game.get_board().figure_final_placement([Cell(5, 0, 1)])
+        game.score_completed_rows(2)
+        data = game.to_bytes()
+        clone = game.clone(with_rng=True)
+        self.assertEqual([clone.get_rng().random() for _ in range(3)], [game.get_rng().random() for _ in range(3)])
+        game.reset()
+        game.restore(data)
+        self.assertEqual((game.get_score(), game.get_lines(), game.get_seed()), (200, 2, 5))
+        self.assertEqual(scores[-1], 200)
+        self.assertEqual(game.get_board().get_cells(), [Cell(5, 0, 1)])
+
+    def test_clones_are_independent(self):
+        scores = []
+        game = Game(6, 4, lambda score: scores.append(score), seed=2)
+        game.get_board().figure_final_placement([Cell(5, 0, 1), Cell(5, 1, 1), Cell(5, 2, 1)])
+        state = (game.get_board().get_cells(), game.get_board().get_col_heights(), game.get_board().get_row_fill())
+        clone = game.clone()
+        clone.get_board().figure_final_placement([Cell(5, 3, 2), Cell(4, 0, 2)])
+        clone.get_board().remove_rows(clone.get_board().get_completed_rows())
+        clone.score_completed_rows(1)
+        self.assertEqual((game.get_board().get_cells(), game.get_board().get_col_heights(),
+                          game.get_board().get_row_fill()), state)
+        self.assertEqual((game.get_score(), scores), (0, []))
+        self.assertEqual(clone.get_board().get_cells(), [Cell(5, 0, 2)])
+        self.assertIs(clone.get_rng(), game.get_rng())
+
+        clone = game.clone(with_rng=True)
+        self.assertIsNot(clone.get_rng(), game.get_rng())
+        drawn = [clone.get_queue().next().get_kind() for _ in range(10)]
+        self.assertEqual([game.get_queue().next().get_kind() for _ in range(10)], drawn)
+
+    def test_figure_queue_peek(self):
+        def kinds(figures: list[Figure]) -> list[tuple[int, int]]:
+            return [(figure.get_kind(), figure.get_projection_idx()) for figure in figures]
+        plain = FigureQueue(random.Random(9))
+        peeking = FigureQueue(random.Random(9))
+        taken = []
+        for _ in range(20):
+            preview = kinds(peeking.peek(3))
+            taken.append(kinds([peeking.next()])[0])
+            self.assertEqual(preview[1:], kinds(peeking.peek(2)))
+        self.assertEqual(taken, kinds([plain.next() for _ in range(20)]))
+
+    def test_figure_queue_bag(self):
+        queue = FigureQueue(random.Random(1), bag=True)
+        count = len(FigureFactory.FIGURES)
+        for _ in range(5):
+            self.assertEqual(sorted(queue.next().get_kind() for _ in range(count)), list(range(count)))
+        game = Game(6, 4, seed=3, bag=True)
+        game.get_queue().next()
+        clone = game.clone(with_rng=True)
+        self.assertEqual([clone.get_queue().next().get_kind() for _ in range(2 * count)],
+                         [game.get_queue().next().get_kind() for _ in range(2 * count)])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from model import Board, Cell, FigureFactory, FigureRendering
+from planner import BeamSearchPlanner, HeuristicPlanner
+from simulator import Simulator
+
+class TestHeuristicPlanner(unittest.TestCase):
+
+    def test_completes_the_line(self):
+        # The well is full except the rightmost column - the vertical I-piece has to go there.
+        board = Board(8, 5, [Cell(row, col, 0) for row in range(4, 8) for col in range(4)])
+        figure_rendering = FigureRendering(board, FigureFactory.get(3, 0), 0)
+        self.assertEqual(HeuristicPlanner().plan(figure_rendering),
+                         ['rotate clockwise', 'move right', 'move right', 'move right', 'release'])
+
+    def test_landings_are_reachable(self):
+        board = Board(6, 6, [Cell(2, 0, 0), Cell(2, 1, 0), Cell(2, 4, 0)])
+        figure_rendering = FigureRendering(board, FigureFactory.get(4, 0), 0)   # O-piece
+        landings = HeuristicPlanner().get_landings(figure_rendering)
+        self.assertEqual(sorted((col, row) for (_, col, row, _) in landings), [(0, 0), (1, 0), (2, 4), (3, 0), (4, 0)])
+
+    def test_beam_search_completes_the_line(self):
+        board = Board(8, 5, [Cell(row, col, 0) for row in range(4, 8) for col in range(4)])
+        figure_rendering = FigureRendering(board, FigureFactory.get(3, 0), 0)
+        planner = BeamSearchPlanner(time_budget_ms=None)
+        self.assertEqual(planner.plan(figure_rendering, [4]),
+                         ['rotate clockwise', 'move right', 'move right', 'move right', 'release'])
+        self.assertEqual(planner.get_completed_depth(), 2)
+        planner.plan(figure_rendering)  # the second piece is unknown
+        self.assertEqual(planner.get_completed_depth(), 2)
+        self.assertGreater(planner.get_table_stats()['hits'], 0)
+
+    def test_beam_search_follows_the_preview(self):
+        heights = [0, 2, 0, 1]
+        board = Board(6, 4, [Cell(5 - row, col, 0) for (col, height) in enumerate(heights) for row in range(height)])
+        figure_rendering = FigureRendering(board, FigureFactory.get(0, 0), 0)
+        planner = BeamSearchPlanner(time_budget_ms=None)
+        landings = {kind: planner.find_best(figure_rendering, [kind]) for kind in range(len(FigureFactory.FIGURES))}
+        self.assertEqual(planner.get_completed_depth(), 2)
+        self.assertEqual((landings[0], landings[4], landings[6]), ((0, 2), (0, 0), (2, 2)))
+
+    def test_beam_search_out_of_time_is_one_ply(self):
+        sim = Simulator(seed=3)
+        (heuristic, beam) = (HeuristicPlanner(), BeamSearchPlanner(time_budget_ms=1e-6, table_size=10))
+        for _ in range(30):
+            figure_rendering = sim.get_figure_rendering()
+            self.assertEqual(beam.find_best(figure_rendering), heuristic.find_best(figure_rendering))
+            self.assertEqual(beam.get_completed_depth(), 1)
+            self.assertLessEqual(beam.get_table_stats()['size'], 10)
+            (steps, col) = heuristic.find_best(figure_rendering)
+            for _ in range(abs(steps)):
+                sim.step('rotate_clockwise' if steps > 0 else 'rotate_counterclockwise')
+            for _ in range(abs(col - sim.get_figure_rendering().get_col())):
+                sim.step('move_right' if col > sim.get_figure_rendering().get_col() else 'move_left')
+            sim.step('hard_drop')
+
+if __name__ == '__main__':
+    unittest.main()
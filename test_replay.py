@@ -0,0 +1,40 @@
+import random
+import unittest
+from replay import InputLog, replay
+from simulator import Simulator, play_random_game
+
+class TestReplay(unittest.TestCase):
+
+    def test_seeded_games_repeat(self):
+        games = []
+        for _ in range(2):
+            sim = Simulator(seed=42)
+            play_random_game(sim, 1000, random.Random(1))
+            games.append((sim.get_game().get_board().get_row_masks(), sim.get_game().get_score(), sim.get_pieces()))
+        self.assertEqual(games[0], games[1])
+
+    def test_record_and_replay(self):
+        ticks = iter(range(0, 10 ** 9, 7))
+        sim = Simulator(seed=7, bag=True)
+        log = InputLog(25, 12, sim.get_game().get_seed(), True, clock=lambda: next(ticks) / 1000)
+        sim.get_controller().set_input_listener(log.append)
+        play_random_game(sim, 5000, random.Random(3))
+        data = log.to_bytes()
+        self.assertLess(len(data), 4 + 8 + len(log.get_events()) * 2)
+        loaded = InputLog.from_bytes(data)
+        self.assertEqual(loaded.get_events(), log.get_events())
+        self.assertTrue(loaded.is_bag())
+        self.assertEqual(loaded.get_events()[1][0], 7)
+        replayed = replay(loaded)
+        self.assertEqual(replayed.get_game().get_board().get_row_masks(), sim.get_game().get_board().get_row_masks())
+        self.assertEqual(replayed.get_game().get_score(), sim.get_game().get_score())
+        self.assertEqual(replayed.is_game_over(), sim.is_game_over())
+        replay(loaded, replayed)
+        self.assertEqual(replayed.get_game().get_score(), sim.get_game().get_score())
+
+    def test_not_a_recording(self):
+        with self.assertRaises(ValueError):
+            InputLog.from_bytes(b'garbage')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import selfplay
+from planner import HeuristicPlanner
+from simulator import Simulator
+
+class TestSelfplay(unittest.TestCase):
+
+    def test_sharded_games_match_single_process(self):
+        seeds = list(range(5))
+        local = {r['seed']: r for r in selfplay.play_games(seeds, 12, 6, max_pieces=30, workers=1)}
+        sharded = {r['seed']: r for r in selfplay.play_games(seeds, 12, 6, max_pieces=30, workers=2, shard_size=2)}
+        self.assertEqual(sharded.keys(), set(seeds))
+        for seed in seeds:
+            self.assertEqual({k: v for (k, v) in sharded[seed].items() if k != 'duration_s'},
+                             {k: v for (k, v) in local[seed].items() if k != 'duration_s'})
+
+    def test_capped_game(self):
+        result = selfplay.play_planner_game(Simulator(), HeuristicPlanner(), 0, max_pieces=10)
+        self.assertFalse(result['game_over'])
+        self.assertEqual(result['pieces'], 10)
+
+    def test_summary(self):
+        streamed = []
+        summary = selfplay.run(4, 10, streamed.append, rows=12, cols=6, max_pieces=20, workers=1)
+        self.assertEqual(len(streamed), 4)
+        self.assertEqual(summary['games'], 4)
+        self.assertEqual(summary['pieces'], sum(r['pieces'] for r in streamed))
+        self.assertLessEqual(summary['score']['min'], summary['score']['median'])
+        self.assertLessEqual(summary['score']['median'], summary['score']['max'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os, random, subprocess, sys
+import unittest
+from model import GameOverException
+from simulator import Simulator, play_random_game
+
+class TestSimulator(unittest.TestCase):
+
+    def test_random_game_runs_to_the_end(self):
+        sim = Simulator(10, 6)
+        play_random_game(sim, 100000, random.Random(1))
+        self.assertTrue(sim.is_game_over())
+        self.assertGreater(sim.get_pieces(), 1)
+        self.assertGreaterEqual(sim.get_game().get_score(), sim.get_ticks())
+        self.assertRaises(GameOverException, sim.tick)
+
+        sim.reset()
+        self.assertFalse(sim.is_game_over())
+        self.assertEqual(sim.get_pieces(), 1)
+        self.assertEqual(sim.get_game().get_board().get_cells(), [])
+
+    def test_gravity_lands_figure(self):
+        # Twice the tallest figure - the next figure fits whatever the first two are.
+        spawned = []
+        sim = Simulator(8, 6, spawned.append)
+        first = sim.get_figure_rendering()
+        while sim.get_figure_rendering() is first:
+            sim.tick()
+        self.assertEqual(len(spawned), 2)
+        self.assertEqual(len(sim.get_game().get_board().get_cells()), len(first.to_cells()))
+
+    def test_snapshot_and_restore(self):
+        sim = Simulator(seed=11)
+        play_random_game(sim, 30, random.Random(2))
+        data = sim.snapshot(with_rng=True)
+        self.assertLess(len(sim.snapshot()), 400)
+        runs = []
+        for _ in range(2):
+            sim.restore(data)
+            play_random_game(sim, 60, random.Random(3))
+            runs.append((sim.get_game().get_board().get_row_masks()[:], sim.get_game().get_score(), sim.get_pieces(),
+                         sim.get_ticks(), sim.get_figure_rendering().to_cells()))
+        self.assertEqual(runs[0], runs[1])
+
+        play_random_game(sim, 100000, random.Random(4))
+        self.assertTrue(sim.is_game_over())
+        over = sim.snapshot()
+        sim.restore(data)
+        sim.restore(over)
+        self.assertTrue(sim.is_game_over())
+        self.assertIsNone(sim.get_figure_rendering())
+
+    def test_headless_without_tk(self):
+        # A fresh interpreter - the view may have been imported by another test of this process.
+        code = 'import sys, simulator; simulator.Simulator().step("hard_drop"); sys.exit("tkinter" in sys.modules)'
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.returncode, 0)
+
+if __name__ == '__main__':
+    unittest.main()
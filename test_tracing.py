@@ -0,0 +1,34 @@
+import unittest
+from tracing import TRACER, Tracer
+from simulator import Simulator
+
+class TestTracing(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        tracer = Tracer(capacity=4, enabled=True)
+        for i in range(6):
+            tracer.record(Tracer.CLEAR, [i])
+        self.assertEqual(tracer.get_recorded(), 6)
+        self.assertEqual([values for (_, _, values) in tracer.get_events()], [([2],), ([3],), ([4],), ([5],)])
+        self.assertEqual(tracer.format().count('\n'), 4)
+        self.assertIn('rows [5] cleared', tracer.format())
+
+    def test_game_events(self):
+        sim = Simulator()
+        TRACER.clear()
+        TRACER.enabled = True
+        try:
+            for _ in range(20):
+                sim.step('move_left')
+            sim.step('hard_drop')
+        finally:
+            TRACER.enabled = False
+        kinds = [kind for (_, kind, _) in TRACER.get_events()]
+        self.assertIn(Tracer.MOVE, kinds)
+        self.assertIn(Tracer.BLOCKED, kinds)
+        self.assertEqual(kinds[-2:], [Tracer.PLACEMENT, Tracer.NEW_FIGURE])
+        self.assertIn('move_left blocked', TRACER.format())
+        TRACER.clear()
+
+if __name__ == '__main__':
+    unittest.main()
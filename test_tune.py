@@ -0,0 +1,34 @@
+import os, tempfile
+import unittest
+from copilot import LocalBackend
+from planner import HeuristicPlanner
+from tune import CrossEntropyTuner
+
+class TestTune(unittest.TestCase):
+
+    def test_checkpoint_resume_and_weights(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = os.path.join(tmp, 'checkpoint.json')
+            settings = dict(population=4, games=2, rows=12, cols=6, max_pieces=20)
+            tuner = CrossEntropyTuner(checkpoint, **settings)
+            tuner.step()
+            tuner.step()
+            resumed = CrossEntropyTuner(checkpoint, **settings)
+            self.assertEqual(resumed.get_generation(), 2)
+            self.assertEqual(resumed.get_best(), tuner.get_best())
+            self.assertRaises(ValueError, CrossEntropyTuner, checkpoint, population=8)
+
+            path = os.path.join(tmp, 'weights.json')
+            resumed.save_weights(path)
+            weights = HeuristicPlanner.load_weights(path)
+            self.assertEqual(weights, tuner.get_best()[0])
+            self.assertNotEqual(LocalBackend(HeuristicPlanner(weights)).get_name(), LocalBackend().get_name())
+
+    def test_evaluations_cached(self):
+        tuner = CrossEntropyTuner(population=1, games=1, rows=12, cols=6, max_pieces=10)
+        for _ in range(3):
+            tuner.step()
+        self.assertEqual(tuner.get_evaluations(), 1)    # the only candidate is the unchanged mean
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+from model import Board, Cell, Game
+from planner import HeuristicPlanner
+from view import CellRenderer, BoardRenderer, BoardView
+from controller import Controller
+
+class FakeCanvas(object):
+    "Records the calls the renderers make, instead of a Tk canvas which needs a display."
+    def __init__(self) -> None:
+        self.items: dict[int, dict] = {}
+        self.calls = 0
+        self.__next_id = 1
+
+    def __find(self, tag_or_id) -> list[int]:
+        if tag_or_id == 'all':
+            return list(self.items)
+        if isinstance(tag_or_id, int):
+            return [tag_or_id] if tag_or_id in self.items else []
+        tags = tag_or_id.split('||')     # the only tag expression the renderers use
+        return [item for (item, options) in self.items.items() if any(tag in options.get('tags', ()) for tag in tags)]
+
+    def create_polygon(self, coords, **options) -> int:
+        self.calls += 1
+        item = self.__next_id
+        self.__next_id += 1
+        self.items[item] = dict(options, coords=list(coords))
+        return item
+
+    def coords(self, item, *coords) -> None:
+        self.calls += 1
+        self.items[item]['coords'] = list(coords)
+
+    def itemconfigure(self, item, **options) -> None:
+        self.calls += 1
+        self.items[item].update(options)
+
+    def move(self, tag_or_id, dx, dy) -> None:
+        self.calls += 1
+        for item in self.__find(tag_or_id):
+            coords = self.items[item]['coords']
+            self.items[item]['coords'] = [c + (dx if i % 2 == 0 else dy) for (i, c) in enumerate(coords)]
+
+    def delete(self, tag_or_id) -> None:
+        self.calls += 1
+        for item in self.__find(tag_or_id):
+            del self.items[item]
+
+class TestCellRenderer(unittest.TestCase):
+
+    def test_items_reused_and_bounded(self):
+        canvas = FakeCanvas()
+        renderer = CellRenderer(canvas, 10)
+        renderer.display([Cell(0, 0, 0), Cell(0, 1, 0)])
+        self.assertEqual(len(canvas.items), 2)
+        for row in range(1, 20):
+            renderer.display([Cell(row, 0, 0), Cell(row, 1, 0)])
+        self.assertEqual(len(canvas.items), 2)
+        self.assertEqual(sorted(item['coords'][1] for item in canvas.items.values()), [192, 192])
+
+        calls = canvas.calls
+        renderer.display([Cell(19, 0, 0), Cell(19, 1, 1)])
+        self.assertEqual(canvas.calls - calls, 1)   # just the restyle
+        renderer.reset()
+        self.assertEqual((len(canvas.items), renderer.get_item_count()), (0, 0))
+
+    def test_board_renderer(self):
+        canvas = FakeCanvas()
+        board = Board(4, 3, [Cell(3, 0, 0), Cell(3, 1, 1)])
+        renderer = BoardRenderer(board, canvas, 10)
+        renderer.display()
+        board.figure_final_placement([Cell(2, 0, 2)])
+        renderer.display()
+        self.assertEqual(len(canvas.items), 3)
+        self.assertEqual(renderer.get_item_count(), 3)
+
+    def test_remove_rows(self):
+        canvas = FakeCanvas()
+        cells = [Cell(0, 1, 0), Cell(1, 0, 0), Cell(1, 1, 0), Cell(2, 0, 0), Cell(3, 0, 0), Cell(3, 1, 0)]
+        board = Board(4, 2, cells)
+        renderer = BoardRenderer(board, canvas, 10)
+        renderer.display()
+        calls = canvas.calls
+        rows = board.get_completed_rows()
+        self.assertEqual(rows, [1, 3])
+        board.remove_rows(rows)
+        renderer.remove_rows(rows)
+        self.assertEqual(canvas.calls - calls, 3)   # 1 delete and a move per shift (rows 0 and 2 shift by 2 and 1)
+        renderer.display()
+        self.assertEqual(canvas.calls - calls, 3)   # the registry matches the board
+        self.assertEqual(sorted(item['coords'][:2] for item in canvas.items.values()), [[2, 32], [12, 22]])
+
+    def test_remove_rows_shared_shift(self):
+        canvas = FakeCanvas()
+        cells = [Cell(0, 0, 0), Cell(1, 1, 0), Cell(2, 0, 0), Cell(3, 0, 0), Cell(3, 1, 0), Cell(4, 0, 0), Cell(4, 1, 0)]
+        board = Board(5, 2, cells)
+        renderer = BoardRenderer(board, canvas, 10)
+        renderer.display()
+        calls = canvas.calls
+        rows = board.get_completed_rows()
+        board.remove_rows(rows)
+        renderer.remove_rows(rows)
+        self.assertEqual(canvas.calls - calls, 2)   # the three lines above shift together
+        renderer.display()
+        self.assertEqual(canvas.calls - calls, 2)
+        self.assertEqual(sorted(item['coords'][:2] for item in canvas.items.values()), [[2, 22], [2, 42], [12, 32]])
+
+    def __play_and_compare(self, auto_render: bool):
+        # Seeded games, restarted on game over - the check does not depend on a lucky piece sequence.
+        canvas = FakeCanvas()
+        game = Game(12, 5, seed=0)
+        game_over = []
+        ctr = Controller(game, BoardView(game.get_board(), canvas, 10), lambda: game_over.append(True), auto_render)
+        ctr.start_game()
+        planner = HeuristicPlanner()
+        (lines, seed) = (0, 0)
+        while lines + game.get_lines() < 20:
+            if game_over:
+                (lines, seed) = (lines + game.get_lines(), seed + 1)
+                game_over.clear()
+                ctr.reset(seed)
+                self.assertEqual(len(canvas.items), len(ctr.get_figure_rendering().to_cells()) if auto_render else 0)
+                ctr.render()
+            (steps, col) = planner.find_best(ctr.get_figure_rendering())
+            for _ in range(abs(steps)):
+                ctr.rotate_clockwise() if steps > 0 else ctr.rotate_counterclockwise()
+            shift = col - ctr.get_figure_rendering().get_col()
+            for _ in range(abs(shift)):
+                ctr.move_right() if shift > 0 else ctr.move_left()
+            ctr.hard_drop()
+            if game_over:
+                continue
+            if not auto_render:
+                self.assertTrue(ctr.render())
+                self.assertFalse(ctr.render())
+            cells = game.get_board().get_cells() + ctr.get_figure_rendering().to_cells()
+            expected = sorted([cell.get_col() * 10 + 2, cell.get_row() * 10 + 2] for cell in cells)
+            self.assertEqual(sorted(item['coords'][:2] for item in canvas.items.values()), expected)
+        self.assertLess(seed, 10)
+
+    def test_canvas_follows_the_game(self):
+        self.__play_and_compare(True)
+
+    def test_canvas_follows_the_game_rendered_per_frame(self):
+        self.__play_and_compare(False)
+
+if __name__ == '__main__':
+    unittest.main()
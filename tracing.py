@@ -0,0 +1,62 @@
+import time
+
+class Tracer(object):
+    """Debug event recorder for the hot paths. An event is a kind and a few raw values stored in
+    preallocated ring buffer slots - nothing is formatted until the events are dumped, and a disabled tracer
+    costs the callers a single attribute check (`if TRACER.enabled:`)."""
+    PLACEMENT, CLEAR, RENDER, MOVE, BLOCKED, NEW_FIGURE = range(6)
+    FORMATS = (
+        'placement of {0} cells, top row {1}, {2} rows completed',
+        'rows {0} cleared',
+        '{0} render diff: {1} put, {2} removed, {3} restyled',
+        '{0} to row {1}, col {2}',
+        '{0} blocked at row {1}, col {2}',
+        'new figure of kind {0}, rotation {1} at col {2}',
+    )
+
+    def __init__(self, capacity: int = 4096, enabled: bool = False) -> None:
+        super().__init__()
+        self.enabled = enabled
+        self.__capacity = capacity
+        self.__times = [0.0] * capacity
+        self.__kinds = [0] * capacity
+        self.__values = [None] * capacity
+        self.__next = 0     # total number of recorded events, the slot is next % capacity
+
+    def record(self, kind: int, *values) -> None:
+        slot = self.__next % self.__capacity
+        self.__times[slot] = time.perf_counter()
+        self.__kinds[slot] = kind
+        self.__values[slot] = values
+        self.__next += 1
+
+    def clear(self) -> None:
+        self.__next = 0
+
+    def get_capacity(self) -> int:
+        return self.__capacity
+
+    def get_recorded(self) -> int:
+        "Number of events recorded since the last clear, including the overwritten ones."
+        return self.__next
+
+    def get_events(self) -> list[tuple[float, int, tuple]]:
+        "The events kept in the buffer, oldest first, as (perf_counter time, kind, values)."
+        first = max(0, self.__next - self.__capacity)
+        return [(self.__times[i % self.__capacity], self.__kinds[i % self.__capacity], self.__values[i % self.__capacity])
+                for i in range(first, self.__next)]
+
+    def format(self) -> str:
+        "The kept events as text lines, the time is relative to the newest event."
+        events = self.get_events()
+        if not events:
+            return ''
+        last = events[-1][0]
+        return ''.join(f'{(t - last) * 1000:12.3f}ms {Tracer.FORMATS[kind].format(*values)}\n'
+                       for (t, kind, values) in events)
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(self.format())
+
+TRACER = Tracer()   # the process-wide tracer used by the model, view and controller
@@ -0,0 +1,157 @@
+import argparse, json, logging, math, os, random, statistics, sys, time
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from planner import HeuristicPlanner
+import selfplay
+
+class CrossEntropyTuner(object):
+    """Cross-entropy search of the planner weights. Every generation samples candidate weight vectors from
+    independent normal distributions, plays the same seeded games with each of them across the worker processes
+    and moves the distributions to the best (elite) candidates.
+
+    The planner picks the best landing, so the weights only matter up to a positive factor - the candidates are
+    normalized to unit length, which also makes the evaluations cache (rounded vector -> fitness) hit more often.
+    The state is checkpointed to a JSON file after every generation and a run resumes from it."""
+    NAMES = tuple(HeuristicPlanner.DEFAULT_WEIGHTS)
+    PRECISION = 4       # decimals of the cached weights
+
+    def __init__(self, checkpoint_path: str = None, population: int = 32, elite: float = 0.25, games: int = 8,
+                 seed: int = 0, rows: int = 25, cols: int = 12, max_pieces: int = 300, noise: float = 0.05) -> None:
+        super().__init__()
+        self.__checkpoint_path = checkpoint_path
+        self.__config = {'population': population, 'elite': elite, 'games': games, 'seed': seed, 'rows': rows,
+                         'cols': cols, 'max_pieces': max_pieces, 'noise': noise}
+        self.__rng = random.Random(seed)
+        self.__generation = 0
+        self.__mean = CrossEntropyTuner.normalize([HeuristicPlanner.DEFAULT_WEIGHTS[name] for name in self.NAMES])
+        self.__std = [0.5] * len(self.NAMES)
+        self.__cache: dict[str, float] = {}
+        self.__best: tuple[list[float], float] = None
+        self.__evaluations = 0
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.__load_checkpoint()
+
+    @staticmethod
+    def normalize(vector: list[float]) -> list[float]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [round(x / norm, CrossEntropyTuner.PRECISION) for x in vector]
+
+    @staticmethod
+    def to_weights(vector: list[float]) -> dict[str, float]:
+        return dict(zip(CrossEntropyTuner.NAMES, vector))
+
+    def __load_checkpoint(self) -> None:
+        with open(self.__checkpoint_path) as f:
+            state = json.load(f)
+        if state['config'] != self.__config:
+            raise ValueError(f'{self.__checkpoint_path} was written with other settings: {state["config"]}')
+        self.__generation = state['generation']
+        self.__mean = state['mean']
+        self.__std = state['std']
+        self.__cache = state['cache']
+        self.__best = (state['best']['vector'], state['best']['fitness']) if state['best'] else None
+        rng_state = state['rng']
+        self.__rng.setstate((rng_state[0], tuple(rng_state[1]), rng_state[2]))
+        logging.info(f'Resumed from {self.__checkpoint_path} at generation {self.__generation}')
+
+    def __save_checkpoint(self) -> None:
+        if not self.__checkpoint_path:
+            return
+        state = {
+            'config': self.__config,
+            'generation': self.__generation,
+            'mean': self.__mean,
+            'std': self.__std,
+            'best': {'vector': self.__best[0], 'fitness': self.__best[1]} if self.__best else None,
+            'cache': self.__cache,
+            'rng': self.__rng.getstate(),
+        }
+        # Written aside and renamed, an interrupted run never leaves a broken checkpoint.
+        with open(f'{self.__checkpoint_path}.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(f'{self.__checkpoint_path}.tmp', self.__checkpoint_path)
+
+    def __evaluate(self, candidates: list[list[float]], executor: Executor) -> list[float]:
+        "Mean lines cleared per game of every candidate. Candidates seen before are taken from the cache."
+        config = self.__config
+        seeds = list(range(config['seed'], config['seed'] + config['games']))
+        keys = [json.dumps(vector) for vector in candidates]
+        missing = list(dict.fromkeys(key for key in keys if key not in self.__cache))
+        args = (config['rows'], config['cols'], config['max_pieces'])
+        if executor:
+            # One task per candidate and game - the finest sharding keeps all the workers busy till the end.
+            futures = {key: [executor.submit(selfplay.play_shard, [seed], *args, self.to_weights(json.loads(key)))
+                             for seed in seeds] for key in missing}
+            results = {key: [r for future in tasks for r in future.result()] for (key, tasks) in futures.items()}
+        else:
+            results = {key: selfplay.play_shard(seeds, *args, self.to_weights(json.loads(key))) for key in missing}
+        for (key, games) in results.items():
+            self.__cache[key] = statistics.fmean(game['lines'] for game in games)
+        self.__evaluations += len(missing)
+        return [self.__cache[key] for key in keys]
+
+    def get_generation(self) -> int:
+        return self.__generation
+
+    def get_evaluations(self) -> int:
+        "Candidates played in this process, the cached ones are not counted."
+        return self.__evaluations
+
+    def get_best(self) -> tuple[dict[str, float], float]:
+        "The best weights found so far and their fitness (mean lines per game), None before the first generation."
+        return (self.to_weights(self.__best[0]), self.__best[1]) if self.__best else None
+
+    def step(self, executor: Executor = None) -> float:
+        "Runs one generation. Returns the best fitness of the generation."
+        config = self.__config
+        candidates = [self.__mean] + [
+            self.normalize([self.__rng.gauss(m, s) for (m, s) in zip(self.__mean, self.__std)])
+            for _ in range(config['population'] - 1)]
+        fitness = self.__evaluate(candidates, executor)
+        ranked = sorted(zip(fitness, candidates), key=lambda x: x[0], reverse=True)
+        elite = [vector for (_, vector) in ranked[:max(2, int(len(ranked) * config['elite']))]]
+        self.__mean = self.normalize([statistics.fmean(values) for values in zip(*elite)])
+        # The extra noise keeps the distributions from collapsing before the search is done.
+        self.__std = [statistics.pstdev(values) + config['noise'] for values in zip(*elite)]
+        if not self.__best or ranked[0][0] > self.__best[1]:
+            self.__best = (ranked[0][1], ranked[0][0])
+        self.__generation += 1
+        self.__save_checkpoint()
+        return ranked[0][0]
+
+    def save_weights(self, path: str) -> None:
+        "Writes the best weights as a JSON file for HeuristicPlanner.load_weights()."
+        with open(path, 'w') as f:
+            json.dump(self.get_best()[0], f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tune the planner weights with the cross-entropy method.')
+    parser.add_argument('--generations', type=int, default=20, help='run until this generation is done')
+    parser.add_argument('--population', type=int, default=32)
+    parser.add_argument('--elite', type=float, default=0.25, help='share of the candidates the next generation follows')
+    parser.add_argument('--games', type=int, default=8, help='seeded games played per candidate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rows', type=int, default=25)
+    parser.add_argument('--cols', type=int, default=12)
+    parser.add_argument('--max-pieces', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--checkpoint', default='tune-checkpoint.json', help='resumed from if it exists')
+    parser.add_argument('--output', default='weights.json')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.WARNING)
+    tuner = CrossEntropyTuner(args.checkpoint, args.population, args.elite, args.games, args.seed,
+                              args.rows, args.cols, args.max_pieces)
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        while tuner.get_generation() < args.generations:
+            start = time.perf_counter()
+            fitness = tuner.step(executor)
+            (weights, best) = tuner.get_best()
+            print(f'Generation {tuner.get_generation()}: best {fitness:.2f} lines/game, overall {best:.2f} '
+                         f'with {weights} ({time.perf_counter() - start:.1f}s, {tuner.get_evaluations()} evaluations)')
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+    tuner.save_weights(args.output)
+    print(f'Weights saved to {args.output}, set TETRIS_COPILOT_WEIGHTS={args.output} to use them')
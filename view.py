@@ -1,96 +1,127 @@
-import logging, random
+import bisect
 from tkinter import Canvas
 from model import Board, Cell
-
-class CellStyles(object):
-    STYLES = [
-        ('yellow', 'green'),
-        ('lightgreen', 'blue'),
-        ('steelblue', 'violet'),
-        ('coral3', 'gold4'),
-    ]
-
-    @classmethod
-    def get_random_style_idx(cls) -> int:
-        return random.randrange(len(cls.STYLES))
-    
-    @classmethod
-    def get_style(cls, style_idx: int) -> tuple[str, str]:
-        return cls.STYLES[style_idx]
+from styles import CellStyles
+from tracing import TRACER, Tracer
 
 class CellRenderer(object):
+    """Draws cells on the canvas. Every displayed cell owns exactly one canvas item, registered by its (row, col),
+    so a frame costs canvas calls only for the changed cells and the number of canvas items stays bounded."""
     def __init__(self, canvas: Canvas, cell_size_px: int) -> None:
         super().__init__()
         self.__canvas = canvas
         self.__cell_size_px = cell_size_px
-        self.__prev_cells: list[Cell] = []
-
-    def __get_changed_cells(self, cells: list[Cell]) -> tuple[list[Cell], list[Cell]]:
-        cells_to_put = []
-        cells_to_remove = []
-
-        def is_cell_in(cell: Cell, cells: list[Cell]) -> bool:
-            for c in cells:
-                if c == cell:
-                    return True
-            return False
-        
-        # TODO: optimize
-        for c in cells:
-            if not is_cell_in(c, self.__prev_cells):
-                cells_to_put.append(c)
-
-        for pc in self.__prev_cells:
-            if not is_cell_in(pc, cells):
-                cells_to_remove.append(pc)
-
-        return (cells_to_put, cells_to_remove)
-
-    def __calc_cell_polygon(self, cell: Cell) -> list[int]:
+        self.__items: dict[tuple[int, int], tuple[int, int]] = {}   # (row, col) -> (canvas item id, style idx)
+
+    def __calc_cell_polygon(self, row: int, col: int) -> list[int]:
         sz = self.__cell_size_px
         margin = 3
-        x = cell.get_col() * sz + 2
-        y = cell.get_row() * sz + 2
+        x = col * sz + 2
+        y = row * sz + 2
         return [x, y, x+sz-margin, y, x+sz-margin, y+sz-margin, x, y+sz-margin]
         # The randomization added during the demo
         # return [x, y, x+sz-margin-random.randint(1,2), y-random.randint(1,2), x+sz-margin+random.randint(1,2), y+sz-margin+random.randint(1,2), x, y+sz-margin]
     
-    def __render_cell(self, cell: Cell) -> None:
-        (fill, outline) = CellStyles.get_style(cell.get_style_idx())
-        self.__canvas.create_polygon(self.__calc_cell_polygon(cell), outline=outline, fill=fill, width=3)
+    def __render_cell(self, row: int, col: int, style_idx: int) -> int:
+        (fill, outline) = CellStyles.get_style(style_idx)
+        return self.__canvas.create_polygon(self.__calc_cell_polygon(row, col), outline=outline, fill=fill, width=3,
+                                            tags=self._get_row_tags(row))
 
-    def __erase_cell(self, cell: Cell) -> None:
-        bg = self.__canvas['background']
-        self.__canvas.create_polygon(self.__calc_cell_polygon(cell), outline=bg, fill=bg, width=3)
+    def __move_cell(self, item: int, row: int, col: int, style_idx: int) -> None:
+        (fill, outline) = CellStyles.get_style(style_idx)
+        self.__canvas.coords(item, *self.__calc_cell_polygon(row, col))
+        self.__canvas.itemconfigure(item, outline=outline, fill=fill, tags=self._get_row_tags(row))
+
+    def _get_row_tags(self, row: int) -> tuple[str, ...]:
+        "Canvas tags of the items in the row."
+        return ()
 
     def _get_canvas(self):
         return self.__canvas
 
+    def _get_cell_size_px(self) -> int:
+        return self.__cell_size_px
+
+    def _get_items(self) -> dict[tuple[int, int], tuple[int, int]]:
+        return self.__items
+
+    def get_item_count(self) -> int:
+        return len(self.__items)
+
     def reset(self) -> None:
-        self.__prev_cells = []
+        "Removes the displayed cells from the canvas."
+        for (item, _) in self.__items.values():
+            self.__canvas.delete(item)
+        self.__items = {}
     
     def display(self, cells: list[Cell]) -> None:
-        (cells_to_put, cells_to_remove) = self.__get_changed_cells(cells)
-        logging.debug(f'Previous cells: {self.__prev_cells}')
-        logging.debug(f'Cells to put: {cells_to_put}')
-        logging.debug(f'Cells to remove: {cells_to_remove}')
-
-        for cell in cells_to_remove:
-            self.__prev_cells.remove(cell)
-            self.__erase_cell(cell)
-
-        for cell in cells_to_put:
-            self.__prev_cells.append(cell)
-            self.__render_cell(cell)
+        cells_styles = {(cell.get_row(), cell.get_col()): cell.get_style_idx() for cell in cells}
+        cells_to_remove = self.__items.keys() - cells_styles.keys()
+        cells_to_put = cells_styles.keys() - self.__items.keys()
+        cells_to_restyle = [key for key in self.__items.keys() & cells_styles.keys()
+                            if self.__items[key][1] != cells_styles[key]]
+        if TRACER.enabled:
+            TRACER.record(Tracer.RENDER, type(self).__name__, len(cells_to_put), len(cells_to_remove), len(cells_to_restyle))
+
+        # The items of the removed cells are reused for the new ones - a moving figure costs no new items.
+        free_items = [self.__items.pop(key)[0] for key in cells_to_remove]
+        for key in cells_to_put:
+            if free_items:
+                item = free_items.pop()
+                self.__move_cell(item, *key, cells_styles[key])
+            else:
+                item = self.__render_cell(*key, cells_styles[key])
+            self.__items[key] = (item, cells_styles[key])
+        for item in free_items:
+            self.__canvas.delete(item)
+        for key in cells_to_restyle:
+            (fill, outline) = CellStyles.get_style(cells_styles[key])
+            self.__canvas.itemconfigure(self.__items[key][0], outline=outline, fill=fill)
+            self.__items[key] = (self.__items[key][0], cells_styles[key])
 
 class BoardRenderer(CellRenderer):
+    """Settled cells. The items of a row are tagged with the id of the line they belong to, the id stays with the line
+    when it shifts down, so removing rows costs a delete and a move per distinct shift, not a call per cell."""
     def __init__(self, board: Board, canvas: Canvas, cell_size_px: int) -> None:
         super().__init__(canvas, cell_size_px)
         self.__board = board
+        self.__line_ids = list(range(board.get_rows()))
+        self.__next_line_id = board.get_rows()
+
+    def __line_tag(self, row: int) -> str:
+        return f'board-line-{self.__line_ids[row]}'
+
+    def _get_row_tags(self, row: int) -> tuple[str, ...]:
+        return ('board', self.__line_tag(row))
 
     def display(self) -> None:
         return super().display(self.__board.get_cells())
 
+    def remove_rows(self, rows: list[int]) -> None:
+        "Mirrors Board.remove_rows on the canvas: deletes the rows items and moves the items above down."
+        removed = sorted(set(rows))
+        canvas = self._get_canvas()
+        items = self._get_items()
+        occupied_rows = {row for (row, _) in items}
+        # Tk tag expressions ('a||b') address several lines at once - a call per distinct shift, not per line.
+        deleted = [self.__line_tag(row) for row in removed if row in occupied_rows]
+        if deleted:
+            canvas.delete('||'.join(deleted))
+        shifts = {row: len(removed) - bisect.bisect_right(removed, row) for row in occupied_rows if row not in removed}
+        moved: dict[int, list[str]] = {}
+        for (row, shift) in shifts.items():
+            if shift:
+                moved.setdefault(shift, []).append(self.__line_tag(row))
+        for (shift, tags) in moved.items():
+            canvas.move('||'.join(tags), 0, shift * self._get_cell_size_px())
+        remapped = {(row + shifts[row], col): item for ((row, col), item) in items.items() if row in shifts}
+        items.clear()
+        items.update(remapped)
+        for row in reversed(removed):
+            del self.__line_ids[row]
+        self.__line_ids[0:0] = range(self.__next_line_id, self.__next_line_id + len(removed))
+        self.__next_line_id += len(removed)
+
     def clear_canvas(self) -> None:
         self._get_canvas().delete("all")
 